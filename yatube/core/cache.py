@@ -0,0 +1,18 @@
+"""Общий ли кэш у процессов сайта.
+
+LocMemCache и DummyCache живут внутри процесса: у каждого веб-воркера
+свой кэш, а management-команда видит только собственный, пустой.
+Всё, что читает или чинит кэш веб-процессов, при таком бэкенде должно
+работать внутри них — через представление, а не через команду.
+"""
+from django.conf import settings
+
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def process_local(alias='default'):
+    """True, если у каждого процесса свой кэш alias."""
+    return settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_BACKENDS
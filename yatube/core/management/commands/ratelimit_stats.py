@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import process_local
+from core.ratelimit import limited_counts
+
+
+class Command(BaseCommand):
+    help = 'Показывает, сколько запросов отклонили лимиты core.ratelimit'
+
+    def handle(self, *args, **options):
+        if process_local():
+            raise CommandError(
+                'Кэш у каждого процесса свой (LocMemCache): счётчики '
+                'веб-воркеров команде не видны. Смотрите их по адресу '
+                'ratelimit_stats.')
+        for (scope, kind), count in sorted(limited_counts().items()):
+            self.stdout.write(f'{scope} ({kind}): отклонено {count}')
@@ -0,0 +1,86 @@
+"""Кэш целых страниц для анонимных GET-запросов.
+
+Представление помечает ответ суррогатными ключами в заголовке
+Surrogate-Key (например, ``post:5 author:2 group:1``). Вместе со
+страницей сохраняются версии её ключей; purge() увеличивает версии,
+и при следующем обращении страница с устаревшей версией считается
+промахом. Так сбрасываются ровно те страницы, которых коснулось
+изменение. Заголовок X-Cache показывает HIT или MISS.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+PAGE_KEY = 'page_cache:page:{}'
+TAG_KEY = 'page_cache:tag:{}'
+
+
+def _initial_version():
+    return int(time.time() * 1000)
+
+
+def _page_key(request):
+    path = request.get_full_path().encode()
+    return PAGE_KEY.format(hashlib.md5(path).hexdigest())
+
+
+def _tag_versions(tags):
+    keys = {TAG_KEY.format(tag): tag for tag in tags}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        cache.add(key, _initial_version(), None)
+        versions[key] = cache.get(key)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def add_surrogate_keys(response, keys):
+    tags = set(response.get('Surrogate-Key', '').split())
+    response['Surrogate-Key'] = ' '.join(sorted(tags.union(keys)))
+    return response
+
+
+def _bump(tags):
+    for tag in tags:
+        key = TAG_KEY.format(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def purge(tags):
+    """Сбрасывает все страницы, помеченные любым из ключей tags."""
+    tags = set(tags)
+    _bump(tags)
+    # Повтор после коммита: страница, отрендеренная по старым данным
+    # до коммита, иначе сохранилась бы уже под новыми версиями.
+    transaction.on_commit(lambda: _bump(tags))
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдаёт анонимам сохранённые страницы, помеченные Surrogate-Key."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return self.get_response(request)
+        key = _page_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            response, versions = entry
+            if _tag_versions(versions) == versions:
+                response['X-Cache'] = 'HIT'
+                return response
+        response = self.get_response(request)
+        tags = response.get('Surrogate-Key', '').split()
+        if (tags and response.status_code == 200
+                and not response.streaming and not response.cookies):
+            cache.set(key, (response, _tag_versions(tags)),
+                      settings.PAGE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,124 @@
+"""Ограничение частоты запросов, которые пишут в базу.
+
+У каждого IP и каждого пользователя своё ведро токенов на область
+(scope) из settings.RATE_LIMITS: ведро вмещает burst токенов и
+пополняется rate токенами в минуту. POST-запрос забирает токен, а при
+пустом ведре сразу получает 429 с Retry-After — раньше представления и
+любой записи в базу, так что поток спама не занимает блокировку
+записи SQLite.
+
+Ведро — одно число в кэше: время, когда оно снова станет полным
+(theoretical arrival time алгоритма GCRA), в миллисекундах. Запрос
+сдвигает его атомарным cache.incr() на интервал между токенами и
+проходит, если время убежало вперёд не дальше ёмкости ведра; отказ
+возвращает токен обратным decr(). Чтения-изменения-записи нет, поэтому
+одновременные запросы не получат лишних токенов. Считать запросы всех
+процессов вместе может только общий кэш (memcached, Redis), а не
+LocMemCache.
+
+Отказы считаются по областям и видам ведер, см. limited_counts(). С
+LocMemCache счётчики живут в каждом веб-воркере отдельно: их отдаёт
+персоналу представление core.views.ratelimit_stats из того воркера,
+что ответил, а одноимённая команда работает только с общим кэшем.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import HttpResponse
+
+BUCKET_KEY = 'ratelimit:bucket:{}:{}:{}'
+LIMITED_KEY = 'ratelimit:limited:{}:{}'
+KINDS = ('ip', 'user')
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def take(scope, kind, ident):
+    """Забирает токен из ведра ident; 0, если он был, иначе через
+    сколько миллисекунд он появится."""
+    burst, rate = settings.RATE_LIMITS[scope]
+    interval = 60 * 1000 // rate
+    capacity = burst * interval
+    key = BUCKET_KEY.format(scope, kind, ident)
+    now = _now()
+    try:
+        full_at = cache.incr(key, interval)
+    except ValueError:
+        # Ведра нет — оно полное. add() не затрёт ведро, которое
+        # успел создать параллельный запрос.
+        if cache.add(key, now + interval, capacity // 1000 + 1):
+            return 0
+        full_at = cache.incr(key, interval)
+    if full_at - interval < now:
+        # Ведро успело наполниться доверху: отсчёт идёт от текущего
+        # времени. Гонка здесь стоит разве что токена полному ведру.
+        cache.set(key, now + interval, capacity // 1000 + 1)
+        return 0
+    if full_at - now > capacity:
+        cache.decr(key, interval)
+        return full_at - now - capacity
+    # incr() не продлевает срок ключа, а ведро должно дожить до
+    # момента, когда снова станет полным.
+    cache.touch(key, (full_at - now) // 1000 + 1)
+    return 0
+
+
+def _count_limited(scope, kind):
+    key = LIMITED_KEY.format(scope, kind)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def limited_counts():
+    """Сколько запросов отклонено: {(область, вид ведра): число}."""
+    keys = {LIMITED_KEY.format(scope, kind): (scope, kind)
+            for scope in settings.RATE_LIMITS for kind in KINDS}
+    counts = cache.get_many(keys)
+    return {name: counts.get(key, 0) for key, name in keys.items()}
+
+
+def check(request, scope):
+    """0, если запрос укладывается в лимиты scope, иначе через сколько
+    миллисекунд его можно повторить."""
+    buckets = [('ip', request.META.get('REMOTE_ADDR', ''))]
+    # Пользователь берётся из сессии: без запроса к auth_user, а у
+    # анонима без сессионной куки — и вовсе без обращения к базе.
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is not None:
+        buckets.append(('user', user_id))
+    for kind, ident in buckets:
+        wait = take(scope, kind, ident)
+        if wait:
+            _count_limited(scope, kind)
+            return wait
+    return 0
+
+
+def too_many_requests(wait):
+    response = HttpResponse('Слишком много запросов, попробуйте позже.',
+                            status=429,
+                            content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = wait // 1000 + 1
+    return response
+
+
+def ratelimit(scope):
+    """Ограничивает POST-запросы представления лимитами scope."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method == 'POST':
+                wait = check(request, scope)
+                if wait:
+                    return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,5 +1,11 @@
+import os
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from core.ratelimit import limited_counts
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию,
@@ -17,3 +23,13 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def ratelimit_stats(request):
+    """Отказы лимитов из кэша этого процесса: с LocMemCache команда
+    ratelimit_stats их не видит."""
+    limited = {}
+    for (scope, kind), count in limited_counts().items():
+        limited.setdefault(scope, {})[kind] = count
+    return JsonResponse({'limited': limited, 'pid': os.getpid()})
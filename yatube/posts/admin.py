@@ -18,7 +18,7 @@ class PostAdmin(admin.ModelAdmin):
 
 
 class GroupAdmin(admin.ModelAdmin):
-    list_display = ('title', 'slug', 'description')
+    list_display = ('title', 'slug', 'description', 'post_count')
     search_fields = ('title',)
     empty_value_display = '-пусто-'
 
@@ -0,0 +1,111 @@
+"""ETag для условных GET-запросов к лентам и страницам постов.
+
+Функции вызываются декоратором condition() до представления, поэтому
+читают только индексы, счётчики и кэш: ни пагинации, ни рендеринга.
+У постов нет времени изменения, так что правки в ленте ловит поколение
+кэша лент (posts.feed_cache), а страница поста хэширует сами поля.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from . import follow_graph, resize
+from .feed_cache import generation
+from .feeds import author_heads
+from .models import AuthorStats, Counter, Group, Post, TimelineEntry, User
+
+
+def _etag(request, *parts):
+    # Страница зависит от пользователя и позиции в ленте, а формы —
+    # ещё и от CSRF-токена сессии.
+    parts += (
+        request.user.pk,
+        request.GET.urlencode(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+    raw = '|'.join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _latest(posts):
+    return posts.order_by('-pub_date', '-id').values_list(
+        'pub_date', flat=True).first()
+
+
+def index_etag(request):
+    count = Counter.objects.get_value(Counter.POSTS, Post.objects.count)
+    return _etag(request, 'index', _latest(Post.objects.all()), count,
+                 generation())
+
+
+def group_etag(request, slug):
+    group = Group.objects.filter(slug=slug).values_list(
+        'id', 'post_count').first()
+    if group is None:
+        return None
+    group_id, count = group
+    return _etag(request, 'group', group_id,
+                 _latest(Post.objects.filter(group_id=group_id)), count,
+                 generation())
+
+
+def profile_etag(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True).first()
+    if author_id is None:
+        return None
+    head = author_heads([author_id])[author_id]
+    # Кнопка «Подписаться/Отписаться» и блок «Кого почитать» зависят от
+    # подписок читателя; новые предложения меняют поколение.
+    followees = follow_graph.reader_followees(request).tobytes()
+    return _etag(request, 'profile', author_id, head[:1],
+                 AuthorStats.objects.post_count(author_id), followees,
+                 generation())
+
+
+def _timeline_etag(request):
+    # Разгрузка при отписке удаляет записи: меняется число и, возможно,
+    # последняя дата, так что одного агрегата по индексу хватает.
+    state = TimelineEntry.objects.filter(user=request.user).aggregate(
+        latest=Max('pub_date'), count=Count('id'))
+    return _etag(request, 'follow', state['latest'], state['count'],
+                 generation())
+
+
+def follow_etag(request):
+    if settings.FOLLOW_FEED_ENGINE == 'timeline':
+        return _timeline_etag(request)
+    author_ids = list(follow_graph.reader_followees(request))
+    heads = author_heads(author_ids)
+    latest = max((head[0] for head in heads.values() if head), default=None)
+    count = sum(len(head) for head in heads.values())
+    return _etag(request, 'follow', author_ids, latest, count, generation())
+
+
+def post_detail_etag(request, post_id):
+    post = Post.objects.filter(pk=post_id).values_list(
+        'pub_date', 'text', 'image', 'group__title',
+        'author__stats__post_count', 'comment_count'
+    ).annotate(last_comment=Max('comments__created')).order_by()[:1]
+    if not post:
+        return None
+    return _etag(request, 'post', post_id, *post)
+
+
+def accepts_webp(request):
+    return 'image/webp' in request.META.get('HTTP_ACCEPT', '')
+
+
+def resized_image_etag(request, width, height, name):
+    # Имя картинки не переиспользуется под другое содержимое (а новые
+    # имена и вовсе хэш содержимого), так что копию определяет адрес
+    # и то, отдаётся ли её вариант в WebP.
+    variant = ''
+    if accepts_webp(request) and resize.is_allowed(width, height):
+        webp = resize.webp_path(resize.resized_path(name, width, height))
+        if os.path.exists(webp):
+            variant = 'webp'
+    return hashlib.sha1(
+        f'{width}x{height}/{name}{variant}'.encode()).hexdigest()
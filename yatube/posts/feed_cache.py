@@ -0,0 +1,53 @@
+"""Версионированный кэш фрагментов лент.
+
+Ключ фрагмента включает поколение ленты, тип и id ленты и позицию
+отрисованной страницы: разобранный курсор (c:...) или проверенный
+номер страницы (p:N). Битый курсор и номер за концом ленты попадают
+под ключ той страницы, что показана на самом деле. Любое изменение
+постов, комментариев или групп увеличивает поколение, и все старые
+фрагменты мгновенно перестают совпадать по ключу, хотя живут в кэше
+минутами.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .paginator import decode_cursor
+
+GENERATION_KEY = 'posts:feed_generation'
+
+
+def _initial_generation():
+    # Если ключ поколения вытеснен из кэша, новое значение всё равно
+    # больше любого прежнего и не совпадёт со старыми фрагментами.
+    return int(time.time() * 1000)
+
+
+def generation():
+    return cache.get_or_set(GENERATION_KEY, _initial_generation, None)
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, _initial_generation(), None)
+
+
+def _position(request, page_obj):
+    if not page_obj.paginator.cursor_mode:
+        return f'p:{page_obj.number}'
+    direction, key = decode_cursor(request.GET.get('cursor'))
+    if key is None:
+        return ''
+    pub_date, pk = key
+    return f'c:{direction}:{pub_date.isoformat()}:{pk}'
+
+
+def feed_cache_context(request, page_obj, feed, feed_id=''):
+    position = _position(request, page_obj)
+    return {
+        'feed_cache_key': f'{generation()}:{feed}:{feed_id}:{position}',
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
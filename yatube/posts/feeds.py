@@ -0,0 +1,167 @@
+"""Ленты подписок и автора поверх кэшированных «голов» авторов.
+
+Для каждого автора в кэше лежит короткий список ключей (pub_date, id)
+его последних постов. Лента подписок собирается k-way слиянием голов
+через heapq, после чего посты страницы читаются одним in_bulk. Если
+страница уходит глубже усечённой головы, недостающие отрезки авторов
+читаются из базы одним keyset-запросом по индексу (author, pub_date,
+id), где ROW_NUMBER() по автору оставляет каждому не больше нужного.
+"""
+import heapq
+from itertools import islice, takewhile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from . import follow_graph
+from .models import Post, TimelineEntry
+from .paginator import (NEWER, OLDER, CursorPaginator, decode_cursor,
+                        keyset_slice)
+from .utils import get_page_obj
+
+HEAD_KEY = 'posts:author_head:{}'
+
+
+def _author_keys(author_id, direction=OLDER, key=None, limit=None):
+    keys = keyset_slice(Post.objects.filter(author_id=author_id),
+                        direction, key,
+                        limit or settings.AUTHOR_HEAD_LENGTH)
+    keys = list(keys.values_list('pub_date', 'id'))
+    if direction == NEWER:
+        keys.reverse()
+    return keys
+
+
+def _authors_keys(author_ids, direction, key, limit):
+    """{автор: до limit ключей от key} для нескольких авторов сразу."""
+    if len(author_ids) == 1:
+        return {author_ids[0]: _author_keys(author_ids[0], direction, key,
+                                            limit)}
+    posts = keyset_slice(Post.objects.filter(author_id__in=author_ids),
+                         direction, key, None).order_by()
+    ordering = [F('pub_date').asc(), F('id').asc()]
+    if direction == OLDER:
+        ordering = [F('pub_date').desc(), F('id').desc()]
+    ranked = posts.annotate(rank=Window(
+        RowNumber(), partition_by=[F('author_id')], order_by=ordering,
+    )).values('id', 'pub_date', 'author_id', 'rank')
+    # Фильтровать по оконной функции ORM не умеет: обёртка в raw().
+    sql, params = ranked.query.sql_with_params()
+    rows = Post.objects.raw(
+        f'SELECT "id", "pub_date", "author_id" FROM ({sql}) '
+        f'WHERE "rank" <= %s', (*params, limit))
+    keys = {author_id: [] for author_id in author_ids}
+    for post in rows:
+        keys[post.author_id].append((post.pub_date, post.id))
+    # Порядок строк окно не обещает, а сортировка в SQL стоила бы
+    # временного B-дерева: отрезки в limit ключей сортируются здесь.
+    for author_keys in keys.values():
+        author_keys.sort(reverse=True)
+    return keys
+
+
+def author_heads(author_ids):
+    """Головы авторов: из кэша, недостающие — из базы с записью в кэш."""
+    keys = {HEAD_KEY.format(author_id): author_id for author_id in author_ids}
+    cached = cache.get_many(keys)
+    missing = {}
+    for key, author_id in keys.items():
+        if key not in cached:
+            missing[key] = cached[key] = _author_keys(author_id)
+    if missing:
+        cache.set_many(missing, settings.AUTHOR_HEAD_TIMEOUT)
+    return {keys[key]: head for key, head in cached.items()}
+
+
+def drop_heads(author_ids):
+    # Сбрасываем и сразу, и после коммита: иначе читатель, успевший
+    # загрузить голову до коммита, вернул бы её в кэш устаревшей.
+    keys = [HEAD_KEY.format(author_id) for author_id in author_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _covers(head, direction, key, limit):
+    """Хватит ли головы, чтобы выдать limit ближайших к ключу постов."""
+    if len(head) < settings.AUTHOR_HEAD_LENGTH:
+        return True
+    if direction == NEWER:
+        return key >= head[-1]
+    if key is None:
+        return len(head) >= limit
+    return sum(1 for item in head if item < key) >= limit
+
+
+def _window(heads, direction, key, per_page):
+    """Ключи страницы от новых к старым и флаги соседних страниц."""
+    short = [author_id for author_id, head in heads.items()
+             if not _covers(head, direction, key, per_page + 1)]
+    sources = dict(heads)
+    if short:
+        sources.update(_authors_keys(short, direction, key, per_page + 1))
+    merged = heapq.merge(*sources.values(), reverse=True)
+    if direction == NEWER:
+        newer = list(takewhile(lambda item: item > key, merged))
+        return newer[-per_page:], len(newer) > per_page, True
+    if key is not None:
+        merged = (item for item in merged if item < key)
+    window = list(islice(merged, per_page + 1))
+    return window[:per_page], key is not None, len(window) > per_page
+
+
+def merged_page(request, author_ids):
+    """Keyset-страница постов авторов, собранная слиянием их голов."""
+    direction, key = decode_cursor(request.GET.get('cursor'))
+    for attempt in range(2):
+        heads = author_heads(author_ids)
+        keys, has_newer, has_older = _window(heads, direction, key,
+                                             settings.POST_PAGE)
+        if direction == NEWER and not keys:
+            direction, key = OLDER, None
+            keys, has_newer, has_older = _window(heads, direction, key,
+                                                 settings.POST_PAGE)
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [post_id for _, post_id in keys])
+        rows = [posts[post_id] for pub_date, post_id in keys
+                if post_id in posts
+                and posts[post_id].pub_date == pub_date
+                and posts[post_id].author_id in heads]
+        if len(rows) == len(keys) or attempt:
+            break
+        # Голова устарела: перечитываем её из базы и собираем заново.
+        drop_heads(author_ids)
+    paginator = CursorPaginator(Post.objects.none(), settings.POST_PAGE)
+    return paginator.page_from_rows(rows, has_newer, has_older)
+
+
+def author_page(request, author, count=None):
+    if 'page' in request.GET:
+        return get_page_obj(request, author.posts.select_related('group'),
+                            count=count)
+    return merged_page(request, [author.id])
+
+
+def timeline_page(request, user):
+    entries = TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group')
+    page_obj = get_page_obj(request, entries, fields=('pub_date', 'post_id'))
+    page_obj.object_list = [entry.post for entry in page_obj]
+    return page_obj
+
+
+def merged_follow_page(request, user):
+    return merged_page(request, list(follow_graph.reader_followees(request)))
+
+
+FOLLOW_ENGINES = {
+    'timeline': timeline_page,
+    'merge': merged_follow_page,
+}
+
+
+def follow_page(request, user):
+    """Лента подписок движком из settings.FOLLOW_FEED_ENGINE."""
+    return FOLLOW_ENGINES[settings.FOLLOW_FEED_ENGINE](request, user)
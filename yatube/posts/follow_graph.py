@@ -0,0 +1,216 @@
+"""Граф подписок в кэше: кого читает пользователь и кто читает автора.
+
+Для каждого пользователя в кэше лежат отсортированные id его авторов,
+а для каждого автора — id подписчиков: байты array('I'), по 4 байта на
+ребро. Список читается из базы при первом обращении, а подписка и
+отписка (сигналы Follow) правят его на месте, так что
+is_following(), followees() и followers() обходятся без SQL.
+
+Правка — чтение, изменение и запись, поэтому одновременные подписки
+одного пользователя могут потерять друг друга, а откат транзакции —
+оставить в кэше ребро, которого нет. С LocMemCache подписка правит
+граф только того воркера, что её принял, а остальные видят старый
+список. Такие расхождения живут не дольше FOLLOW_GRAPH_TIMEOUT;
+находит и чинит их check_all().
+
+Поэтому граф годится только для чтения: то, что записывается в базу
+(раскладка постов по лентам), читает подписчиков из Follow. Свои же
+подписки читатель видит сразу: ответ на подписку ставит куку со
+временем правки (mark_changed), и reader_followees() перечитывает из
+базы список, загруженный в кэш этого воркера раньше. Кука живёт
+FOLLOW_GRAPH_TIMEOUT — дольше старый список в кэше не продержится.
+
+check_all() сверяет тот кэш, который видит вызвавший процесс. С общим
+кэшем (memcached, Redis) это делает команда check_follow_graph, а с
+LocMemCache у каждого веб-воркера свой граф, и команда в отдельном
+процессе увидела бы пустой кэш — поэтому она отказывается работать, а
+сверку запускает персонал представлением follow_graph_check внутри
+воркера. Оно проверяет только граф того воркера, что ответил.
+"""
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow, User
+
+FOLLOWEES_KEY = 'posts:followees:{}'
+FOLLOWERS_KEY = 'posts:followers:{}'
+LOADED_KEY = 'posts:followees_loaded:{}'
+CHANGED_COOKIE = 'follows_changed'
+CHECK_BATCH_SIZE = 500
+TYPECODE = 'I'
+
+# Ключ кэша, поле Follow с id вершины и поле с id соседей.
+EDGES = {
+    FOLLOWEES_KEY: ('user_id', 'author_id'),
+    FOLLOWERS_KEY: ('author_id', 'user_id'),
+}
+
+
+def _load(key_format, node_id):
+    node_field, other_field = EDGES[key_format]
+    return array(TYPECODE, Follow.objects.filter(
+        **{node_field: node_id}).order_by(other_field).values_list(
+        other_field, flat=True))
+
+
+def _store_followees(user_id):
+    ids = _load(FOLLOWEES_KEY, user_id)
+    cache.set_many({FOLLOWEES_KEY.format(user_id): ids.tobytes(),
+                    LOADED_KEY.format(user_id): time.time()},
+                   settings.FOLLOW_GRAPH_TIMEOUT)
+    return ids
+
+
+def _edges(key_format, node_id):
+    key = key_format.format(node_id)
+    packed = cache.get(key)
+    if packed is None:
+        if key_format == FOLLOWEES_KEY:
+            return _store_followees(node_id)
+        ids = _load(key_format, node_id)
+        cache.set(key, ids.tobytes(), settings.FOLLOW_GRAPH_TIMEOUT)
+        return ids
+    ids = array(TYPECODE)
+    ids.frombytes(packed)
+    return ids
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def followees(user_id):
+    """Отсортированные id авторов, на которых подписан user_id."""
+    return _edges(FOLLOWEES_KEY, user_id)
+
+
+def followers(author_id):
+    """Отсортированные id подписчиков автора author_id."""
+    return _edges(FOLLOWERS_KEY, author_id)
+
+
+def is_following(user_id, author_id):
+    if user_id is None:
+        return False
+    return _contains(followees(user_id), author_id)
+
+
+def mark_changed(response):
+    """Отмечает в ответе, что читатель сам поменял подписки."""
+    response.set_cookie(CHANGED_COOKIE, repr(time.time()),
+                        max_age=settings.FOLLOW_GRAPH_TIMEOUT)
+
+
+def reader_followees(request):
+    """Подписки читателя запроса, включая его собственные правки,
+    которые граф этого воркера мог не увидеть."""
+    if not request.user.is_authenticated:
+        return array(TYPECODE)
+    user_id = request.user.pk
+    try:
+        changed = float(request.COOKIES[CHANGED_COOKIE])
+    except (KeyError, ValueError):
+        changed = None
+    if changed is not None:
+        loaded = cache.get(LOADED_KEY.format(user_id))
+        if loaded is None or loaded < changed:
+            return _store_followees(user_id)
+    return followees(user_id)
+
+
+def reader_follows(request, author_id):
+    return _contains(reader_followees(request), author_id)
+
+
+def _update(key_format, node_id, other_ids, add):
+    key = key_format.format(node_id)
+    packed = cache.get(key)
+    if packed is None:
+        # Списка нет в кэше: его прочитают из базы уже с изменением.
+        return
+    ids = array(TYPECODE)
+    ids.frombytes(packed)
+    changed = False
+    for other_id in other_ids:
+        index = bisect_left(ids, other_id)
+        present = index < len(ids) and ids[index] == other_id
+        if add and not present:
+            ids.insert(index, other_id)
+        elif not add and present:
+            del ids[index]
+        else:
+            continue
+        changed = True
+    if changed:
+        cache.set(key, ids.tobytes(), settings.FOLLOW_GRAPH_TIMEOUT)
+
+
+def _apply(user_id, author_ids, add):
+    def update():
+        _update(FOLLOWEES_KEY, user_id, author_ids, add)
+        for author_id in author_ids:
+            _update(FOLLOWERS_KEY, author_id, [user_id], add)
+    # Правка идемпотентна и повторяется после коммита: загрузка, которая
+    # успела прочитать базу до коммита, не оставит в кэше старый список.
+    update()
+    transaction.on_commit(update)
+
+
+def add(user_id, author_ids):
+    """Подписывает в графе user_id на авторов author_ids."""
+    _apply(user_id, author_ids, True)
+
+
+def remove(user_id, author_ids):
+    _apply(user_id, author_ids, False)
+
+
+def _load_many(key_format, node_ids):
+    node_field, other_field = EDGES[key_format]
+    loaded = {node_id: array(TYPECODE) for node_id in node_ids}
+    edges = Follow.objects.filter(
+        **{f'{node_field}__in': node_ids}).order_by(
+        node_field, other_field).values_list(node_field, other_field)
+    for node_id, other_id in edges:
+        loaded[node_id].append(other_id)
+    return loaded
+
+
+def check(key_format, node_ids, fix=False):
+    """id вершин, чьи списки в кэше расходятся с базой; с fix=True
+    такие списки заменяются прочитанными из базы."""
+    keys = {key_format.format(node_id): node_id for node_id in node_ids}
+    cached = {keys[key]: packed
+              for key, packed in cache.get_many(keys).items()}
+    actual = _load_many(key_format, list(cached))
+    broken = [node_id for node_id, packed in cached.items()
+              if packed != actual[node_id].tobytes()]
+    if fix:
+        cache.set_many({key_format.format(node_id):
+                        actual[node_id].tobytes() for node_id in broken},
+                       settings.FOLLOW_GRAPH_TIMEOUT)
+    return broken
+
+
+def check_all(fix=False, batch_size=CHECK_BATCH_SIZE):
+    """Сверяет графы всех пользователей пачками по batch_size.
+
+    Возвращает число разошедшихся списков (подписок, подписчиков).
+    """
+    broken = {FOLLOWEES_KEY: 0, FOLLOWERS_KEY: 0}
+    user_ids = User.objects.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while True:
+        batch = list(user_ids.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]
+        for key_format in broken:
+            broken[key_format] += len(check(key_format, batch, fix))
+    return broken[FOLLOWEES_KEY], broken[FOLLOWERS_KEY]
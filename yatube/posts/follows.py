@@ -0,0 +1,71 @@
+"""Подписка и отписка на много авторов за раз.
+
+Имена разрешаются одним запросом. Новые подписки вставляются одним
+bulk_create поверх ограничения unique_follow, а отписки — обычным
+QuerySet.delete(). Лента подписок и граф подписок правятся сразу для
+всех авторов: bulk_create сигналов не шлёт, а post_delete по строке
+гасится follow_rows_handled(), поэтому их работа сделана явно.
+"""
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import follow_graph, timeline
+from .models import Follow
+from .signals import follow_rows_handled
+
+User = get_user_model()
+
+BulkResult = namedtuple('BulkResult', 'changed missing')
+
+
+def _resolve(user, usernames):
+    """{имя: id} найденных авторов, кроме самого user, и список
+    ненайденных имён."""
+    usernames = set(usernames) - {user.username}
+    found = dict(User.objects.filter(username__in=usernames).values_list(
+        'username', 'id'))
+    return found, sorted(usernames - found.keys())
+
+
+def follow_many(user, usernames):
+    """Подписывает user на авторов usernames.
+
+    В changed попадают авторы, подписок на которых не было при чтении.
+    Если ту же подписку одновременно создал другой запрос, ignore_conflicts
+    молча пропустит строку, и автор окажется в changed у обоих: такой
+    отчёт завышен, но лента и граф от повторной правки не портятся.
+    """
+    found, missing = _resolve(user, usernames)
+    with transaction.atomic():
+        existing = set(Follow.objects.filter(
+            user=user, author_id__in=found.values()).values_list(
+            'author_id', flat=True))
+        new = {username: author_id for username, author_id in found.items()
+               if author_id not in existing}
+        if new:
+            Follow.objects.bulk_create(
+                [Follow(user=user, author_id=author_id)
+                 for author_id in new.values()],
+                ignore_conflicts=True)
+            timeline.backfill(user.id, list(new.values()))
+            follow_graph.add(user.id, sorted(new.values()))
+    return BulkResult(sorted(new), missing)
+
+
+def unfollow_many(user, usernames):
+    found, missing = _resolve(user, usernames)
+    follows = Follow.objects.filter(user=user, author_id__in=found.values())
+    with transaction.atomic():
+        removed = set(follows.values_list('author_id', flat=True))
+        if removed:
+            # Прочие получатели сигналов и каскады отрабатывают как
+            # обычно; гасится только построчная правка ленты и графа.
+            with follow_rows_handled():
+                follows.delete()
+            timeline.prune(user.id, list(removed))
+            follow_graph.remove(user.id, sorted(removed))
+    return BulkResult(sorted(username for username, author_id
+                             in found.items() if author_id in removed),
+                      missing)
@@ -1,5 +1,8 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import normalize
 from .models import Post, Comment
 
 
@@ -8,6 +11,31 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        if image.size > settings.POST_IMAGE_MAX_BYTES:
+            raise forms.ValidationError(
+                'Файл больше %(limit)d МБ.',
+                params={'limit': settings.POST_IMAGE_MAX_BYTES >> 20})
+        # ImageField уже прочитал заголовок: размеры известны
+        # до декодирования пикселей.
+        width, height = image.image.size
+        limit = settings.POST_IMAGE_MAX_PIXELS
+        if image.image.format != 'JPEG':
+            # Уменьшенное декодирование (draft) есть только у JPEG.
+            limit = min(limit, settings.POST_IMAGE_MAX_DECODE_PIXELS)
+        if width * height > limit:
+            raise forms.ValidationError(
+                'Картинка больше %(limit)d мегапикселей.',
+                params={'limit': limit // 10**6})
+        try:
+            return normalize(image, settings.POST_IMAGE_MAX_SIDE) or image
+        except Exception:
+            raise forms.ValidationError(
+                'Не удалось обработать картинку, загрузите другую.')
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,143 @@
+"""Сведения о картинке поста: размеры, вес и размытая заглушка.
+
+Считаются один раз при загрузке (Post.save) или командой
+backfill_image_meta, чтобы шаблонам не приходилось открывать файл.
+Заглушка — крошечный PNG в data URI: браузер растягивает его под
+размеры картинки, и до её загрузки на месте видно размытое пятно.
+
+Здесь же normalize(): PostForm уменьшает слишком большие загрузки до
+settings.POST_IMAGE_MAX_SIDE, не держа в памяти ни файл, ни полный
+декодированный кадр, — и save_optimized(), которым сохраняются все
+картинки, что сайт пишет сам.
+"""
+import base64
+import io
+import math
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image, ImageOps
+
+PLACEHOLDER_SIZE = (8, 8)
+# Тег EXIF с поворотом снимка и его значения, при которых стороны
+# кадра меняются местами.
+ORIENTATION = 0x0112
+ROTATED = {5, 6, 7, 8}
+
+EMPTY_META = {
+    'image_width': None,
+    'image_height': None,
+    'image_size': None,
+    'image_placeholder': '',
+}
+
+
+def image_meta(fp, size):
+    """Сведения о картинке из открытого файла fp весом size байт."""
+    with Image.open(fp) as image:
+        width, height = image.size
+        # Для JPEG draft() декодирует сразу в уменьшенном масштабе.
+        image.draft('RGB', PLACEHOLDER_SIZE)
+        image.thumbnail(PLACEHOLDER_SIZE)
+        buffer = io.BytesIO()
+        image.convert('RGB').save(buffer, 'PNG', optimize=True)
+    data = base64.b64encode(buffer.getvalue()).decode()
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': size,
+        'image_placeholder': f'data:image/png;base64,{data}',
+    }
+
+
+def field_meta(field_file):
+    """Сведения о картинке поля модели; если файл не читается — пустые."""
+    if not field_file:
+        return dict(EMPTY_META)
+    committed = getattr(field_file, '_committed', True)
+    try:
+        field_file.open('rb')
+        return image_meta(field_file, field_file.size)
+    except Exception:
+        return dict(EMPTY_META)
+    finally:
+        if committed:
+            field_file.close()
+        elif not field_file.closed:
+            # Загрузку ещё предстоит сохранить в хранилище с начала.
+            field_file.seek(0)
+
+
+def path_meta(path):
+    """Сведения о картинке по пути на диске (для пула процессов)."""
+    try:
+        with open(path, 'rb') as fp:
+            return image_meta(fp, os.path.getsize(path))
+    except Exception:
+        return dict(EMPTY_META)
+
+
+def save_optimized(image, fp, image_format, quality=85):
+    """Сохраняет image в fp как можно компактнее.
+
+    Метаданные (EXIF, комментарии) не переносятся, кроме цветового
+    профиля; JPEG пишется прогрессивным.
+    """
+    options = {'optimize': True}
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        options.update(quality=quality, progressive=True)
+    elif image_format == 'WEBP':
+        options.update(quality=quality, method=6)
+    icc_profile = image.info.get('icc_profile')
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    image.save(fp, image_format, **options)
+
+
+def transpose(image):
+    """Поворачивает кадр по тегу Orientation из EXIF.
+
+    save_optimized() EXIF не переносит, а с ним пропал бы и поворот:
+    снимки с телефона легли бы набок.
+    """
+    if image.getexif().get(ORIENTATION, 1) == 1:
+        return image
+    return ImageOps.exif_transpose(image)
+
+
+def normalize(upload, max_side):
+    """Уменьшает загрузку до max_side по большей стороне.
+
+    Возвращает новый временный файл (на диске, если он больше
+    FILE_UPLOAD_MAX_MEMORY_SIZE) или None, если картинка
+    и так не больше max_side (или анимирована: кадры не пережимаем).
+    """
+    try:
+        with Image.open(upload) as image:
+            width, height = image.size
+            if (max(width, height) <= max_side
+                    or getattr(image, 'is_animated', False)):
+                return None
+            image_format = image.format
+            # JPEG декодируется сразу с уменьшением в 2, 4 или 8 раз —
+            # в наибольшее, после которого сторона не меньше max_side.
+            # Кадр в памяти тогда меньше (2 * max_side)² пикселей, каким
+            # бы большим ни был исходник; остальное доделывает resize.
+            ratio = max_side / max(width, height)
+            image.draft(None, (math.ceil(width * ratio),
+                               math.ceil(height * ratio)))
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+            # Рамка квадратная, так что поворачиваем уже уменьшенный кадр.
+            image = transpose(image)
+            result = tempfile.SpooledTemporaryFile(
+                max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE,
+                dir=settings.FILE_UPLOAD_TEMP_DIR)
+            save_optimized(image, result, image_format, quality=90)
+    finally:
+        upload.seek(0)
+    result.seek(0)
+    return File(result, name=upload.name)
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from posts.images import EMPTY_META, path_meta
+from posts.models import Post
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, вес и заглушки картинок уже загруженных '
+            'постов, читая файлы в пуле процессов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число процессов для чтения картинок')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать и уже заполненные посты')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').order_by('id')
+        if not options['all']:
+            posts = posts.filter(image_width__isnull=True)
+        updated = unreadable = 0
+        last_id = 0
+        with ProcessPoolExecutor(options['workers']) as pool:
+            while True:
+                batch = list(posts.filter(id__gt=last_id).only(
+                    'id', 'image')[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                names = sorted({post.image.name for post in batch})
+                paths = [default_storage.path(name) for name in names]
+                metas = dict(zip(names, pool.map(path_meta, paths)))
+                for post in batch:
+                    meta = metas[post.image.name]
+                    if meta == EMPTY_META:
+                        unreadable += 1
+                    for field, value in meta.items():
+                        setattr(post, field, value)
+                Post.objects.bulk_update(batch, list(EMPTY_META))
+                updated += len(batch)
+        self.stdout.write(
+            f'Обработано постов: {updated}, не прочитано картинок: '
+            f'{unreadable}')
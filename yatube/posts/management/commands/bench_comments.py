@@ -0,0 +1,97 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Comment, Post
+from posts.utils import get_comments_page
+
+COMMENTS = 10_000
+THREADS = 500
+REPEAT = 5
+
+User = get_user_model()
+
+
+def build_thread(comments, post, author, next_id, size, rng):
+    """Ветка из size комментариев: каждый отвечает на случайный
+    предыдущий, не глубже Comment.MAX_DEPTH."""
+    root_path = f'{next_id:0{Comment.PATH_STEP}d}'
+    thread = [Comment(id=next_id, post=post, author=author, path=root_path,
+                      text=f'Комментарий {next_id}')]
+    for comment_id in range(next_id + 1, next_id + size):
+        parent = rng.choice(thread)
+        if parent.depth >= Comment.MAX_DEPTH - 1:
+            parent = thread[0]
+        thread.append(Comment(
+            id=comment_id, post=post, author=author, parent_id=parent.id,
+            path=f'{parent.path}{comment_id:0{Comment.PATH_STEP}d}',
+            text=f'Комментарий {comment_id}'))
+    comments.extend(thread)
+    return thread
+
+
+def naive_thread(root):
+    """Ветка через parent: запрос на каждый комментарий."""
+    result = [root]
+    for reply in root.replies.select_related('author').order_by('id'):
+        result.extend(naive_thread(reply))
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Замеряет чтение веток комментариев по материализованному '
+            'пути на посте с множеством комментариев; данные удаляются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=COMMENTS)
+        parser.add_argument('--threads', type=int, default=THREADS)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def measure(self, title, load):
+        best = None
+        for _ in range(REPEAT):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                rows = len(load())
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        self.stdout.write(f'{title:<34} {rows:>6} {len(queries):>8} '
+                          f'{best * 1000:>9.1f}')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            author = User.objects.create_user(username='bench_comments')
+            post = Post.objects.create(author=author, text='Замер')
+            next_id = (Comment.objects.aggregate(Max('id'))['id__max']
+                       or 0) + 1
+            per_thread = max(options['comments'] // options['threads'], 1)
+            comments, threads = [], []
+            for _ in range(options['threads']):
+                threads.append(build_thread(comments, post, author, next_id,
+                                            per_thread, rng))
+                next_id += per_thread
+            Comment.objects.bulk_create(comments, batch_size=500)
+            self.report(post, threads)
+            # Замер ничего не оставляет в базе.
+            transaction.set_rollback(True)
+
+    def report(self, post, threads):
+        last_page = f'{threads[-1][0].id:0{Comment.PATH_STEP}d}'
+        root = threads[0][0]
+        self.stdout.write(f'{"":<34} {"строк":>6} {"запросов":>8} '
+                          f'{"мс":>9}')
+        self.measure('первая страница веток',
+                     lambda: get_comments_page(post.id).comments)
+        self.measure('последняя страница веток',
+                     lambda: get_comments_page(post.id, last_page).comments)
+        self.measure('ветка по пути',
+                     lambda: list(Comment.objects.subtree(root)
+                                  .select_related('author')))
+        self.measure('ветка через parent (N+1)',
+                     lambda: naive_thread(root))
@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+
+import django
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+SIDES = (1000, 4000, 8000)
+
+
+def make_image(path, side, image_format):
+    # Градиент вместо однотонной заливки: у кодера есть работа.
+    gradient = Image.linear_gradient('L').resize((side, side // 2))
+    Image.merge('RGB', (gradient, gradient.rotate(90, expand=False),
+                        gradient)).save(path, image_format, quality=90)
+
+
+def _status_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field):
+                return int(line.split()[1])
+
+
+def start_peak():
+    """Сбрасывает пик RSS процесса и возвращает текущий RSS, КБ.
+
+    Пик после импорта Django выше, чем нужно одной загрузке, поэтому
+    на Linux он обнуляется через clear_refs; в других системах замер
+    грубее — по ru_maxrss.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return _status_kb('VmRSS:')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def peak_kb():
+    try:
+        return _status_kb('VmHWM:')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def ingest(path, naive, queue):
+    """Одна загрузка в чистом процессе (spawn): пик не смешивается с
+    памятью, которую успел занять и освободить родитель."""
+    django.setup()
+    from posts.forms import PostForm
+    baseline = start_peak()
+    if naive:
+        with Image.open(path) as image:
+            image.load()
+    else:
+        upload = TemporaryUploadedFile(
+            os.path.basename(path), 'application/octet-stream',
+            os.path.getsize(path), None)
+        with open(path, 'rb') as source:
+            shutil.copyfileobj(source, upload)
+        upload.seek(0)
+        form = PostForm(data={'text': 'Замер'}, files={'image': upload})
+        if not form.is_valid():
+            queue.put((None, ' '.join(form.errors.get('image', []))))
+            return
+        form.cleaned_data['image'].close()
+        upload.close()
+    queue.put((peak_kb() - baseline, None))
+
+
+class Command(BaseCommand):
+    help = ('Замеряет пик памяти при приёме картинки через PostForm '
+            'и при полном декодировании той же картинки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sides', type=int, nargs='+', default=SIDES,
+                            help='Ширины тестовых картинок (высота вдвое '
+                                 'меньше)')
+        parser.add_argument('--format', default='JPEG',
+                            choices=('JPEG', 'PNG'))
+
+    def measure(self, path, naive):
+        context = multiprocessing.get_context('spawn')
+        queue = context.Queue()
+        process = context.Process(target=ingest, args=(path, naive, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        return result
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp()
+        try:
+            self.stdout.write(f'{"картинка":>12} {"файл, КБ":>9} '
+                              f'{"PostForm, МБ":>13} {"decode, МБ":>11}')
+            for side in options['sides']:
+                path = os.path.join(
+                    workdir, f'{side}.{options["format"].lower()}')
+                make_image(path, side, options['format'])
+                form_kb, error = self.measure(path, naive=False)
+                naive_kb, _ = self.measure(path, naive=True)
+                form = 'отклонена' if error else f'{form_kb / 1024:.1f}'
+                row = (f'{side:>6}x{side // 2:<5} '
+                       f'{os.path.getsize(path) // 1024:>9} '
+                       f'{form:>13} {naive_kb / 1024:>11.1f} {error or ""}')
+                self.stdout.write(row.rstrip())
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import process_local
+from posts import follow_graph
+
+
+class Command(BaseCommand):
+    help = ('Сверяет закэшированные списки подписок и подписчиков '
+            '(posts.follow_graph) с таблицей Follow')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Заменить разошедшиеся списки')
+        parser.add_argument('--batch-size', type=int,
+                            default=follow_graph.CHECK_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if process_local():
+            raise CommandError(
+                'Кэш у каждого процесса свой (LocMemCache): команда '
+                'видит только собственный пустой кэш. Сверяйте граф '
+                'представлением posts:follow_graph_check.')
+        followees, followers = follow_graph.check_all(
+            options['fix'], options['batch_size'])
+        self.stdout.write(f'Расходится подписок: {followees}, '
+                          f'подписчиков: {followers}')
+        if (followees or followers) and not options['fix']:
+            raise CommandError('Граф подписок расходится с базой')
@@ -0,0 +1,191 @@
+import json
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import resize, thumbnails
+from posts.models import Post
+from posts.storage import post_images
+
+CHUNK_SIZE = 500
+# Файл моложе этого мог быть записан загрузкой, чей пост ещё не
+# закоммичен, поэтому он не считается мусором.
+MIN_AGE = 60 * 60
+
+
+def walk(root, top, after=''):
+    """Файлы каталога top хранилища с корнем root по порядку имён.
+
+    Отдаёт пары (имя относительно root, os.DirEntry) строго по
+    возрастанию имён, поэтому обход можно продолжить с любого имени:
+    файлы не больше after и целиком пройденные каталоги пропускаются.
+    """
+    try:
+        with os.scandir(os.path.join(root, top)) as entries:
+            # Каталог сортируется с «/» на конце: так порядок обхода
+            # совпадает с порядком полных имён ('ab.gif' < 'ab/cd').
+            entries = sorted(
+                entries,
+                key=lambda entry: entry.name + '/' * entry.is_dir())
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.name.startswith('.'):
+            # Служебные файлы, например замки posts.resize.
+            continue
+        name = f'{top}/{entry.name}'
+        if entry.is_dir():
+            if after.startswith(name + '/') or name + '/' > after:
+                yield from walk(root, name, after)
+        elif name > after:
+            yield name, entry
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = ('Удаляет или убирает в карантин картинки, на которые не '
+            'ссылается ни один пост, и их миниатюры')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать мусор, ничего не трогая')
+        parser.add_argument('--quarantine', metavar='DIR',
+                            help='Переносить мусор в DIR, а не удалять')
+        parser.add_argument('--checkpoint', metavar='FILE',
+                            help='Файл, где запоминается пройденное: '
+                                 'прерванный обход продолжится с него')
+        parser.add_argument('--min-age', type=int, default=MIN_AGE,
+                            help='Не трогать файлы моложе стольких секунд')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.checkpoint = self.load_checkpoint()
+        self.born_before = time.time() - options['min_age']
+        # Просмотрено файлов, из них мусора, его объём в байтах.
+        self.stats = {'originals': [0, 0, 0], 'thumbnails': [0, 0, 0]}
+        self.collect('originals', post_images.location, 'posts',
+                     self.unused_originals)
+        self.collect('thumbnails', settings.MEDIA_ROOT, resize.PREFIX,
+                     self.unused_thumbnails)
+        if options['checkpoint'] and not options['dry_run']:
+            # Обход закончен: следующий запуск начнёт сначала.
+            os.remove(options['checkpoint'])
+        verb = 'найдено' if options['dry_run'] else 'убрано'
+        for kind, (scanned, removed, size) in self.stats.items():
+            self.stdout.write(
+                f'{kind}: просмотрено {scanned}, {verb} {removed} '
+                f'({size // 1024} КБ)')
+
+    def load_checkpoint(self):
+        path = self.options['checkpoint']
+        if path and os.path.exists(path):
+            with open(path) as checkpoint:
+                return json.load(checkpoint)
+        return {}
+
+    def save_checkpoint(self, kind, name):
+        path = self.options['checkpoint']
+        if not path or self.options['dry_run']:
+            return
+        self.checkpoint[kind] = name
+        # Запись через переименование: прерывание не оставит полфайла.
+        with open(path + '.tmp', 'w') as checkpoint:
+            json.dump(self.checkpoint, checkpoint)
+        os.replace(path + '.tmp', path)
+
+    def collect(self, kind, root, top, find_unused):
+        """Обходит top кусками по chunk_size, сверяя их find_unused."""
+        stats = self.stats[kind]
+        files = walk(root, top, self.checkpoint.get(kind, ''))
+        for chunk in chunked(files, self.options['chunk_size']):
+            stats[0] += len(chunk)
+            old = {name: entry for name, entry in chunk
+                   if entry.stat().st_mtime < self.born_before}
+            for name in find_unused(list(old)):
+                size = old[name].stat().st_size
+                if not self.options['dry_run']:
+                    if not self.still_unused(root, name, find_unused):
+                        continue
+                    if kind == 'originals':
+                        self.remove_copies(name)
+                    self.remove(kind, root, name)
+                stats[1] += 1
+                stats[2] += size
+            self.save_checkpoint(kind, chunk[-1][0])
+
+    def still_unused(self, root, name, find_unused):
+        """Перепроверка прямо перед удалением: пока шла сверка куска,
+        загрузка могла повторить файл (storage обновит его mtime) и
+        закоммитить пост с ним."""
+        try:
+            mtime = os.stat(os.path.join(root, name)).st_mtime
+        except FileNotFoundError:
+            return False
+        return mtime < self.born_before and bool(find_unused([name]))
+
+    def used(self, names):
+        return set(Post.objects.filter(image__in=names)
+                   .values_list('image', flat=True).distinct())
+
+    def unused_originals(self, names):
+        used = self.used(names)
+        return [name for name in names if name not in used]
+
+    def remove_copies(self, name):
+        # Миниатюры уходят вместе с картинкой: в карантин, чтобы его
+        # можно было вернуть целиком, или насовсем.
+        if not self.options['quarantine']:
+            thumbnails.forget(name)
+            return
+        for size in resize.sizes():
+            copy = resize.resized_name(name, *size)
+            for copy_name in (copy, resize.webp_path(copy)):
+                self.remove('thumbnails', settings.MEDIA_ROOT, copy_name)
+
+    def unused_thumbnails(self, names):
+        # Миниатюра не нужна, если её размер больше не разрешён или её
+        # картинку не показывает ни один пост.
+        sources = {}
+        for name in names:
+            parsed = resize.parse(name)
+            if parsed is None:
+                sources[name] = ()
+                continue
+            # У варианта <копия>.webp картинка — имя копии без .webp.
+            source = parsed[0]
+            sources[name] = (source, source[:-len('.webp')]) if (
+                source.endswith('.webp')) else (source,)
+        used = self.used({source for candidates in sources.values()
+                          for source in candidates})
+        return [name for name, candidates in sources.items()
+                if not used.intersection(candidates)]
+
+    def remove(self, kind, root, name):
+        path = os.path.join(root, name)
+        if not self.options['quarantine']:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Уже удалён, например forget() вместе с картинкой.
+                pass
+            return
+        target = os.path.join(self.options['quarantine'], kind, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            shutil.move(path, target)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import follows
+
+BATCH_SIZE = 500
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Подписывает пользователя на авторов из списка или из файла '
+            '(по имени в строке) либо отписывает от них')
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='Имя подписчика')
+        parser.add_argument('authors', nargs='*', help='Имена авторов')
+        parser.add_argument('--file', help='Файл с именами авторов')
+        parser.add_argument('--unfollow', action='store_true',
+                            help='Отписать, а не подписать')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'Нет пользователя {options["user"]}')
+        usernames = list(options['authors'])
+        if options['file']:
+            with open(options['file']) as file:
+                usernames += [line.strip() for line in file if line.strip()]
+        action = follows.unfollow_many if options['unfollow'] else (
+            follows.follow_many)
+        changed = missing = 0
+        size = options['batch_size']
+        for start in range(0, len(usernames), size):
+            result = action(user, usernames[start:start + size])
+            changed += len(result.changed)
+            missing += len(result.missing)
+            for username in result.missing:
+                self.stderr.write(f'Нет автора {username}')
+        verb = 'Отписано' if options['unfollow'] else 'Подписано'
+        self.stdout.write(f'{verb}: {changed}, не найдено: {missing}')
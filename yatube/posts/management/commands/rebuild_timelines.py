@@ -0,0 +1,23 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Заново строит материализованные ленты подписок'
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.order_by('user_id').values_list(
+            'user_id', 'author_id')
+        with transaction.atomic():
+            TimelineEntry.objects.all().delete()
+            for user_id, edges in groupby(follows.iterator(),
+                                          key=lambda edge: edge[0]):
+                timeline.backfill(
+                    user_id, [author_id for _, author_id in edges])
+        self.stdout.write(
+            f'Записей в лентах: {TimelineEntry.objects.count()}')
@@ -0,0 +1,117 @@
+import random
+import resource
+import time
+from array import array
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import recommendations
+from posts.feed_cache import bump_generation
+from posts.models import Suggestion
+
+BATCH_SIZE = 1000
+
+
+def synthetic_follows(edges, users, seed):
+    """Случайный граф подписок: у каждого пользователя edges / users
+    авторов, популярность авторов — по закону Ципфа."""
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, users + 1)]
+    total = 0
+    cum_weights = []
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+    ids = list(range(1, users + 1))
+    rng.shuffle(ids)
+    degree = max(edges // users, 1)
+    for user_id in range(1, users + 1):
+        followees = set(rng.choices(ids, cum_weights=cum_weights, k=degree))
+        followees.discard(user_id)
+        for author_id in sorted(followees):
+            yield user_id, author_id
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает предложения «кого почитать» по подпискам '
+            'и комментариям или замеряет расчёт на случайном графе')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, metavar='EDGES',
+                            help='Только замер на случайном графе из '
+                                 'EDGES подписок, без записи в базу')
+        parser.add_argument('--users', type=int,
+                            help='Пользователей в случайном графе '
+                                 '(по умолчанию EDGES / 10)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        self.options = options
+        started = time.perf_counter()
+        if options['synthetic']:
+            edges = options['synthetic']
+            users = options['users'] or max(edges // 10, 1)
+            follows = recommendations.CSR(
+                synthetic_follows(edges, users, options['seed']))
+            empty = recommendations.CSR(())
+            comments = (empty, empty)
+            authors = array('I', range(1, users + 1))
+        else:
+            follows = recommendations.load_follows()
+            comments = recommendations.load_comments()
+            authors = recommendations.load_authors()
+        loaded = time.perf_counter()
+        user_ids = sorted(set(follows.rows) | set(comments[0].rows))
+        stored = 0
+        for start in range(0, len(user_ids), options['batch_size']):
+            batch = user_ids[start:start + options['batch_size']]
+            suggestions = {
+                user_id: recommendations.suggest(
+                    user_id, follows, *comments, authors,
+                    settings.SUGGESTIONS_PER_USER)
+                for user_id in batch
+            }
+            if not options['synthetic']:
+                last = (user_ids[start + len(batch)]
+                        if start + len(batch) < len(user_ids) else None)
+                self.store(batch[0] if start else 0, last, suggestions)
+            stored += sum(map(len, suggestions.values()))
+        if not user_ids and not options['synthetic']:
+            # Ни подписок, ни комментариев: старые предложения устарели.
+            self.store(0, None, {})
+        if not options['synthetic']:
+            # Предложения входят в ETag страниц через поколение лент.
+            bump_generation()
+        finished = time.perf_counter()
+        matrix_mb = (follows.nbytes + comments[0].nbytes
+                     + comments[1].nbytes) / 2**20
+        self.stdout.write(
+            f'Рёбер подписок: {len(follows)}, комментариев: '
+            f'{len(comments[0])}; пользователей: {len(user_ids)}, '
+            f'предложений: {stored}')
+        self.stdout.write(
+            f'Загрузка {loaded - started:.1f} с, расчёт '
+            f'{finished - loaded:.1f} с; матрицы {matrix_mb:.1f} МБ, '
+            f'пик памяти процесса {self.peak_mb():.0f} МБ')
+
+    def peak_mb(self):
+        # ru_maxrss в Linux — в килобайтах.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def store(self, first, last, suggestions):
+        """Заменяет предложения пользователей с id от first до last
+        (не включая) — в том числе тех, кому предложить больше нечего."""
+        stale = Suggestion.objects.filter(user_id__gte=first)
+        if last is not None:
+            stale = stale.filter(user_id__lt=last)
+        with transaction.atomic():
+            stale.delete()
+            Suggestion.objects.bulk_create([
+                Suggestion(user_id=user_id, author_id=author_id,
+                           rank=rank, score=score)
+                for user_id, found in suggestions.items()
+                for rank, (score, author_id) in enumerate(found)
+            ], batch_size=self.options['batch_size'])
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+
+from posts.models import AuthorStats, Counter, Group, Post
+
+BATCH_SIZE = 500
+
+
+def counts_by(field):
+    # order_by() сбрасывает Meta.ordering, иначе pub_date попадёт в GROUP BY.
+    return dict(
+        Post.objects.order_by().values_list(field).annotate(Count('id'))
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает и исправляет денормализованные счётчики постов'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed_groups = self.repair_groups()
+            fixed_authors = self.repair_authors()
+            fixed_posts = self.repair_comments()
+            total = Post.objects.count()
+            Counter.objects.update_or_create(
+                name=Counter.POSTS, defaults={'value': total})
+        self.stdout.write(
+            f'Исправлено групп: {fixed_groups}, авторов: {fixed_authors}, '
+            f'счётчиков комментариев: {fixed_posts}; '
+            f'всего постов: {total}'
+        )
+
+    def repair_groups(self):
+        per_group = counts_by('group')
+        changed = []
+        for group in Group.objects.only('id', 'post_count').iterator():
+            actual = per_group.get(group.id, 0)
+            if group.post_count != actual:
+                group.post_count = actual
+                changed.append(group)
+        Group.objects.bulk_update(changed, ['post_count'],
+                                  batch_size=BATCH_SIZE)
+        return len(changed)
+
+    def repair_authors(self):
+        per_author = counts_by('author')
+        changed = []
+        for stats in AuthorStats.objects.iterator():
+            actual = per_author.pop(stats.user_id, 0)
+            if stats.post_count != actual:
+                stats.post_count = actual
+                changed.append(stats)
+        AuthorStats.objects.bulk_update(changed, ['post_count'],
+                                        batch_size=BATCH_SIZE)
+        missing = [AuthorStats(user_id=user_id, post_count=actual)
+                   for user_id, actual in per_author.items()]
+        AuthorStats.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+        return len(changed) + len(missing)
+
+    def repair_comments(self):
+        # Сравнение идёт в HAVING: в Python приходят только расхождения.
+        wrong = Post.objects.order_by().annotate(
+            actual=Count('comments')).exclude(
+            comment_count=F('actual')).values_list('id', 'actual')
+        changed = [Post(id=post_id, comment_count=actual)
+                   for post_id, actual in wrong.iterator()]
+        Post.objects.bulk_update(changed, ['comment_count'],
+                                 batch_size=BATCH_SIZE)
+        return len(changed)
@@ -0,0 +1,191 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, Value, When
+from PIL import Image, ImageOps, features
+
+from core.page_cache import purge
+from posts import resize, thumbnails
+from posts.feed_cache import bump_generation
+from posts.images import save_optimized
+from posts.models import Post
+from posts.storage import post_images
+
+BATCH_SIZE = 200
+QUALITY = 85
+# Пережатие JPEG теряет качество: ради пары процентов не стоит.
+MIN_SAVING = 0.05
+# Пережимаются только эти форматы; GIF бывает анимированным.
+FORMATS = {'JPEG', 'PNG'}
+
+
+def reencode(path, quality, min_saving):
+    """Пережимает картинку path во временный файл.
+
+    Возвращает (байт до, байт после, временный файл или None, ширина,
+    высота). Файла нет, если формат не пережимается или экономия меньше
+    min_saving.
+    """
+    before = os.path.getsize(path)
+    try:
+        with Image.open(path) as image:
+            if image.format not in FORMATS:
+                return before, before, None, None, None
+            image_format = image.format
+            # EXIF с поворотом не переносится: поворачиваем сами.
+            image = ImageOps.exif_transpose(image)
+            fd, temp = tempfile.mkstemp(dir=settings.FILE_UPLOAD_TEMP_DIR)
+            with os.fdopen(fd, 'wb') as target:
+                save_optimized(image, target, image_format, quality)
+    except OSError:
+        return before, before, None, None, None
+    after = os.path.getsize(temp)
+    if after > before * (1 - min_saving):
+        os.remove(temp)
+        return before, before, None, None, None
+    return before, after, temp, image.width, image.height
+
+
+def webp_variant(path, quality):
+    """Пишет <path>.webp, если он меньше path. Возвращает (байт до,
+    байт после)."""
+    before = os.path.getsize(path)
+    target = resize.webp_path(path)
+    try:
+        with Image.open(path) as image:
+            if image.format not in FORMATS:
+                return before, before
+            image.load()
+    except OSError:
+        return before, before
+    resize.write_atomic(
+        target, lambda file: save_optimized(image, file, 'WEBP', quality))
+    after = os.path.getsize(target)
+    if after >= before:
+        os.remove(target)
+        return before, before
+    return before, after
+
+
+class Command(BaseCommand):
+    help = ('Пережимает картинки постов без метаданных, прогрессивными '
+            'и оптимизированными, если это их уменьшает, и по желанию '
+            'добавляет миниатюрам варианты в WebP')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число процессов для пережатия')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--quality', type=int, default=QUALITY,
+                            help='Качество JPEG и WebP')
+        parser.add_argument('--min-saving', type=float, default=MIN_SAVING,
+                            help='Минимальная доля экономии, 0..1')
+        parser.add_argument('--webp', action='store_true',
+                            help='Записать миниатюрам варианты в WebP')
+        parser.add_argument('--keep-originals', action='store_true',
+                            help='Не удалять исходные файлы')
+
+    def handle(self, *args, **options):
+        if options['webp'] and not features.check('webp'):
+            raise CommandError('Pillow собран без поддержки WebP')
+        self.options = options
+        # Байт до и после: оригиналы и варианты миниатюр в WebP.
+        self.originals = [0, 0]
+        self.webp = [0, 0]
+        self.replaced = 0
+        names = (Post.objects.exclude(image='').order_by('image')
+                 .values_list('image', flat=True).distinct())
+        last_name = ''
+        with ProcessPoolExecutor(options['workers']) as pool:
+            while True:
+                batch = list(names.filter(image__gt=last_name)
+                             [:options['batch_size']])
+                if not batch:
+                    break
+                last_name = batch[-1]
+                self.reencode_batch(pool, batch)
+        if self.replaced:
+            # update() не шлёт сигналов: кэши лент сбрасываются здесь.
+            bump_generation()
+        self.report('Оригиналы', self.originals)
+        if options['webp']:
+            self.report('Миниатюры в WebP', self.webp)
+        self.stdout.write(f'Заменено картинок: {self.replaced}')
+
+    def report(self, title, sizes):
+        before, after = sizes
+        saved = 100 * (before - after) / before if before else 0
+        self.stdout.write(f'{title}: {before // 1024} КБ -> '
+                          f'{after // 1024} КБ (-{saved:.1f}%)')
+
+    def reencode_batch(self, pool, names):
+        names = [name for name in names if post_images.exists(name)]
+        results = pool.map(
+            reencode, [post_images.path(name) for name in names],
+            [self.options['quality']] * len(names),
+            [self.options['min_saving']] * len(names))
+        replaced = {}
+        for name, (before, after, temp, width, height) in zip(names,
+                                                              results):
+            self.originals[0] += before
+            self.originals[1] += after
+            if temp is None:
+                continue
+            try:
+                with open(temp, 'rb') as content:
+                    new = post_images.save(name, File(content))
+            finally:
+                os.remove(temp)
+            replaced[name] = (new, after, width, height)
+        if replaced:
+            self.replace(replaced)
+        if self.options['webp']:
+            self.add_webp(pool, [replaced.get(name, (name,))[0]
+                                 for name in names])
+
+    def replace(self, replaced):
+        def case(index):
+            return Case(*[When(image=old, then=Value(values[index]))
+                          for old, values in replaced.items()])
+
+        posts = Post.objects.filter(image__in=replaced)
+        with transaction.atomic():
+            post_ids = list(posts.values_list('id', flat=True))
+            posts.update(image=case(0), image_size=case(1),
+                         image_width=case(2), image_height=case(3))
+            purge({f'post:{post_id}' for post_id in post_ids})
+        for old, (new, *_) in replaced.items():
+            self.move_copies(old, new)
+            thumbnails.forget(old)
+            if not self.options['keep_originals'] and old != new:
+                post_images.delete(old)
+        self.replaced += len(replaced)
+
+    def move_copies(self, old, new):
+        # Миниатюры от пережатия почти не меняются: переезжают под
+        # новое имя вместо повторной нарезки.
+        for width, height in resize.sizes():
+            source = resize.resized_path(old, width, height)
+            target = resize.resized_path(new, width, height)
+            if os.path.exists(source) and not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(source, target)
+
+    def add_webp(self, pool, names):
+        copies = []
+        for name in names:
+            for width, height in resize.sizes():
+                try:
+                    copies.append(resize.render(name, width, height))
+                except OSError:
+                    pass
+        for before, after in pool.map(webp_variant, copies,
+                                      [self.options['quality']]
+                                      * len(copies)):
+            self.webp[0] += before
+            self.webp[1] += after
@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Value, When
+
+from core.page_cache import purge
+from posts import thumbnails
+from posts.feed_cache import bump_generation
+from posts.models import Post
+from posts.storage import post_images
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов, загруженные до хранилища по '
+            'содержимому, под имена из SHA-256 и склеивает дубликаты')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Сколько разных картинок переносить за раз')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, ничего не меняя')
+        parser.add_argument('--keep-originals', action='store_true',
+                            help='Не удалять старые файлы после переноса')
+
+    def handle(self, *args, **options):
+        names = (Post.objects.exclude(image='').order_by('image')
+                 .values_list('image', flat=True).distinct())
+        self.moved = self.missing = self.posts = 0
+        self.unique = set()
+        last_name = ''
+        while True:
+            batch = list(names.filter(image__gt=last_name)
+                         [:options['batch_size']])
+            if not batch:
+                break
+            last_name = batch[-1]
+            mapping = self.rehash(
+                [name for name in batch if not post_images.is_hashed(name)],
+                options['dry_run'])
+            if mapping and not options['dry_run']:
+                self.rewrite(mapping, options['keep_originals'])
+        if self.moved and not options['dry_run']:
+            # update() не шлёт сигналов: кэши лент сбрасываются здесь.
+            bump_generation()
+        self.stdout.write(
+            f'Перенесено картинок: {self.moved} (уникальных: '
+            f'{len(self.unique)}), постов: {self.posts}; '
+            f'нет файла: {self.missing}')
+
+    def rehash(self, names, dry_run):
+        """Старое имя -> имя по содержимому для существующих файлов."""
+        mapping = {}
+        for name in names:
+            if not post_images.exists(name):
+                self.missing += 1
+                continue
+            with post_images.open(name) as content:
+                if dry_run:
+                    mapping[name] = post_images.hashed_name(name, content)
+                else:
+                    # Хранилище само не пишет файл, если такой уже есть.
+                    mapping[name] = post_images.save(name, content)
+        self.moved += len(mapping)
+        self.unique.update(mapping.values())
+        if dry_run:
+            self.posts += Post.objects.filter(image__in=mapping).count()
+        return mapping
+
+    def rewrite(self, mapping, keep_originals):
+        posts = Post.objects.filter(image__in=mapping)
+        with transaction.atomic():
+            post_ids = list(posts.values_list('id', flat=True))
+            self.posts += posts.update(image=Case(
+                *[When(image=old, then=Value(new))
+                  for old, new in mapping.items()]))
+            purge({f'post:{post_id}' for post_id in post_ids})
+        for old, new in mapping.items():
+            thumbnails.forget(old)
+            if not keep_originals:
+                post_images.delete(old)
+            # Миниатюры режутся один раз на уникальную картинку.
+            if not thumbnails.generated(new):
+                thumbnails.generate(new)
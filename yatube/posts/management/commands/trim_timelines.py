@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import User
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Обрезает материализованные ленты подписок до '
+            'FOLLOW_TIMELINE_LENGTH записей; запускается периодически')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        user_ids = User.objects.order_by('id').values_list('id', flat=True)
+        last_id = 0
+        trimmed = 0
+        while True:
+            batch = list(user_ids.filter(
+                id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1]
+            trimmed += timeline.trim(batch)
+        self.stdout.write(f'Обрезано лент: {trimmed}')
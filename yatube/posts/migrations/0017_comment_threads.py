@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 1000
+
+
+def fill_paths(apps, schema_editor):
+    # До веток все комментарии верхнего уровня: путь — собственный id.
+    # Пачки по id, и на каждую — один UPDATE через bulk_update.
+    Comment = apps.get_model('posts', 'Comment')
+    comments = Comment.objects.order_by('id').only('id')
+    last_id = 0
+    while True:
+        batch = list(comments.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        for comment in batch:
+            comment.path = f'{comment.id:010d}'
+        Comment.objects.bulk_update(batch, ['path'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=160, verbose_name='Путь в ветке'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'parent', 'path'], name='comment_post_parent_idx'),
+        ),
+    ]
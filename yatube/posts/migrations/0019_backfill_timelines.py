@@ -0,0 +1,54 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_timelines(apps, schema_editor):
+    """Заполняет ленты подписок, которые были до 0011_follow_timeline.
+
+    Как timeline.backfill(): каждому подписчику — последние
+    FOLLOW_TIMELINE_LENGTH постов его авторов, одним запросом на
+    подписчика. Записи вставляются пачками по BATCH_SIZE; уже
+    заполненные ленты не трогаются, так что повторный прогон безопасен.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    limit = settings.FOLLOW_TIMELINE_LENGTH
+    filled = set(TimelineEntry.objects.order_by().values_list(
+        'user_id', flat=True).distinct())
+    edges = Follow.objects.order_by('user_id').values_list(
+        'user_id', 'author_id')
+    entries = []
+    for user_id, group in groupby(edges.iterator(), key=itemgetter(0)):
+        if user_id in filled:
+            continue
+        posts = Post.objects.filter(
+            author_id__in=[author_id for _, author_id in group]
+        ).order_by('-pub_date', '-id').values_list(
+            'id', 'author_id', 'pub_date')[:limit]
+        entries.extend(
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for post_id, author_id, pub_date in posts)
+        if len(entries) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(
+                entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+            entries = []
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_suggestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,20 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DEFERRED, F
+
+from .images import field_meta
+from .storage import post_images
 
 User = get_user_model()
 
 
+class PostManager(models.Manager):
+    def add_comments(self, post_id, delta):
+        if post_id is not None:
+            self.filter(pk=post_id).update(
+                comment_count=F('comment_count') + delta)
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст поста',
                             help_text='Введите текст поста')
@@ -22,22 +33,110 @@ class Post(models.Model):
                               )
     image = models.ImageField('Картинка',
                               upload_to='posts/',
+                              storage=post_images,
                               blank=True
                               )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, editable=False)
+    image_size = models.PositiveIntegerField(
+        'Вес картинки, байт', null=True, editable=False)
+    image_placeholder = models.TextField(
+        'Заглушка картинки', blank=True, editable=False)
+    comment_count = models.PositiveIntegerField(
+        'Число комментариев', default=0, editable=False)
+
+    objects = PostManager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Группа на момент загрузки: нужна, чтобы при смене группы
+        # перенести пост из одного счётчика в другой. DEFERRED — группу
+        # не загружали (only/defer), и None тут был бы неправдой.
+        self._loaded_group_id = self.__dict__.get('group_id', DEFERRED)
+        # Имя картинки из базы (см. from_db): у новой картинки считаются
+        # сведения (posts.images) и нарезаются миниатюры.
+        self._loaded_image = ''
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # None — картинку не загружали (only/defer), сравнивать не с чем.
+        post._loaded_image = post.__dict__.get('image')
+        return post
+
+    def image_changed(self):
+        if self._loaded_image is None or 'image' not in self.__dict__:
+            return False
+        return (self.image.name or '') != self._loaded_image
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        if self.image_changed():
+            for field, value in field_meta(self.image).items():
+                setattr(self, field, value)
+        if not created and kwargs.get('update_fields') is None:
+            # Счётчик комментариев меняют только атомарные UPDATE:
+            # правка поста не должна затирать его прочитанным значением.
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+                and field.name != 'comment_count']
+        with transaction.atomic():
+            loaded_group_id = self._loaded_group_id
+            if (not created and loaded_group_id is DEFERRED
+                    and 'group_id' in self.__dict__):
+                # Группу не загружали, но задали: прежняя — в базе.
+                loaded_group_id = Post.objects.filter(
+                    pk=self.pk).values_list('group_id', flat=True).first()
+            super().save(*args, **kwargs)
+            if created:
+                Counter.objects.add(Counter.POSTS, 1)
+                AuthorStats.objects.add_posts(self.author_id, 1)
+                Group.objects.add_posts(self.group_id, 1)
+            elif (loaded_group_id is not DEFERRED
+                    and self.group_id != loaded_group_id):
+                Group.objects.add_posts(loaded_group_id, -1)
+                Group.objects.add_posts(self.group_id, 1)
+        self._loaded_group_id = self.__dict__.get('group_id', DEFERRED)
+        if 'image' in self.__dict__:
+            self._loaded_image = self.image.name or ''
+
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            # Поиск постов по файлу: сборка мусора, дедупликация.
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
+
+
+class GroupManager(models.Manager):
+    def add_posts(self, group_id, delta):
+        if group_id is not None:
+            self.filter(pk=group_id).update(post_count=F('post_count') + delta)
 
 
 class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Название')
     slug = models.SlugField(unique=True)
     description = models.TextField(verbose_name='Описание')
+    post_count = models.PositiveIntegerField(
+        verbose_name='Число постов', default=0, editable=False)
+
+    objects = GroupManager()
 
     def __str__(self):
         return self.title
@@ -46,7 +145,24 @@ class Group(models.Model):
         verbose_name = 'Группа'
 
 
+class CommentManager(models.Manager):
+    def subtree(self, comment):
+        """Комментарий со всеми ответами в порядке обхода дерева —
+        один диапазон по индексу (post, path)."""
+        return self.filter(
+            post_id=comment.post_id, path__gte=comment.path,
+            path__lt=comment.path + Comment.PATH_END).order_by('path')
+
+
 class Comment(models.Model):
+    # Путь — id всех предков и самого комментария по PATH_STEP цифр.
+    # Сортировка по нему обходит дерево в глубину, ответы идут за
+    # родителем по порядку создания, а поддерево — диапазон
+    # [path, path + PATH_END): символ ':' следует в ASCII за '9'.
+    PATH_STEP = 10
+    PATH_END = ':'
+    MAX_DEPTH = 16
+
     post = models.ForeignKey('Post', blank=True, null=True,
                              on_delete=models.CASCADE,
                              related_name='comments'
@@ -55,13 +171,52 @@ class Comment(models.Model):
                                on_delete=models.CASCADE,
                                related_name='comments'
                                )
+    parent = models.ForeignKey('self', blank=True, null=True,
+                               on_delete=models.CASCADE,
+                               related_name='replies',
+                               verbose_name='Ответ на'
+                               )
+    path = models.CharField('Путь в ветке', max_length=PATH_STEP * MAX_DEPTH,
+                            editable=False)
     text = models.TextField(verbose_name='Текст комментария')
     created = models.DateTimeField(
         verbose_name='Дата комментария', auto_now_add=True)
 
+    objects = CommentManager()
+
     def __str__(self):
         return self.text[:30]
 
+    @property
+    def depth(self):
+        return len(self.path) // self.PATH_STEP - 1
+
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        if (created and self.parent_id
+                and self.parent.depth >= self.MAX_DEPTH - 1):
+            # Глубже не вкладываем: ответ встаёт рядом с родителем.
+            self.parent = self.parent.parent
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if created:
+                # Путь включает собственный id, известный после вставки.
+                parent_path = self.parent.path if self.parent_id else ''
+                self.path = f'{parent_path}{self.pk:0{self.PATH_STEP}d}'
+                Comment.objects.filter(pk=self.pk).update(path=self.path)
+                Post.objects.add_comments(self.post_id, 1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+            models.Index(fields=['post', 'path'],
+                         name='comment_post_path_idx'),
+            # Корни веток поста по порядку, без обхода ответов.
+            models.Index(fields=['post', 'parent', 'path'],
+                         name='comment_post_parent_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -76,3 +231,119 @@ class Follow(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'author'], name='unique_follow')
         ]
+        indexes = [
+            # Подписчики автора без обращения к таблице: fan-out ленты.
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
+
+class AuthorStatsManager(models.Manager):
+    def add_posts(self, user_id, delta):
+        # Отсутствующая строка не создаётся: её заполнит post_count()
+        # по фактическим данным при первом чтении.
+        self.filter(user_id=user_id).update(
+            post_count=F('post_count') + delta)
+
+    def post_count(self, user_id):
+        value = self.filter(user_id=user_id).values_list(
+            'post_count', flat=True).first()
+        if value is None:
+            value = Post.objects.filter(author_id=user_id).count()
+            self.get_or_create(user_id=user_id,
+                               defaults={'post_count': value})
+        return value
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                related_name='stats',
+                                verbose_name='Автор'
+                                )
+    post_count = models.PositiveIntegerField(
+        verbose_name='Число постов', default=0)
+
+    objects = AuthorStatsManager()
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+
+class CounterManager(models.Manager):
+    def add(self, name, delta):
+        self.filter(name=name).update(value=F('value') + delta)
+
+    def get_value(self, name, default):
+        """Значение счётчика; при отсутствии считается вызовом default()."""
+        value = self.filter(name=name).values_list('value', flat=True).first()
+        if value is None:
+            value = default()
+            self.get_or_create(name=name, defaults={'value': value})
+        return value
+
+
+class Counter(models.Model):
+    POSTS = 'posts'
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.IntegerField(default=0)
+
+    objects = CounterManager()
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост в ленте подписчика."""
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline'
+                             )
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='timeline_entries'
+                             )
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+'
+                               )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class Suggestion(models.Model):
+    """Автор, которого стоит предложить пользователю; строки считает
+    команда recommend_authors (posts.recommendations)."""
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='suggestions'
+                             )
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+'
+                               )
+    rank = models.PositiveSmallIntegerField('Место')
+    score = models.FloatField('Вес')
+
+    class Meta:
+        constraints = [
+            # Заодно индекс: предложения пользователя по порядку.
+            models.UniqueConstraint(
+                fields=['user', 'rank'], name='unique_suggestion_rank')
+        ]
+        verbose_name = 'Предложенный автор'
+        verbose_name_plural = 'Предложенные авторы'
@@ -0,0 +1,185 @@
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+OLDER = 'o'
+NEWER = 'n'
+
+
+def encode_cursor(direction, pub_date, pk):
+    raw = f'{direction}|{pub_date.isoformat()}|{pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(cursor):
+    """Возвращает (направление, (дата, id)); битый курсор — первая страница."""
+    if not cursor:
+        return OLDER, None
+    try:
+        direction, pub_date, pk = force_str(
+            urlsafe_base64_decode(cursor)).split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return OLDER, None
+    if direction not in (OLDER, NEWER) or pub_date is None:
+        return OLDER, None
+    return direction, (pub_date, pk)
+
+
+def keyset_slice(queryset, direction, key, limit, fields=('pub_date', 'id')):
+    """До limit строк строго старше (OLDER) или новее (NEWER) ключа.
+
+    Строки идут в порядке обхода: от ключа вглубь ленты для OLDER и от
+    ключа к свежим записям для NEWER.
+    """
+    date_field, id_field = fields
+    lookup = 'lt' if direction == OLDER else 'gt'
+    if key is not None:
+        # (date < d) OR (date = d AND id < pk), записанное так, чтобы
+        # условие было диапазоном по индексу (date, id), а не OR двух
+        # поисков с последующей сортировкой.
+        pub_date, pk = key
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__{lookup}e': pub_date}),
+            Q(**{f'{date_field}__{lookup}': pub_date})
+            | Q(**{f'{id_field}__{lookup}': pk})
+        )
+    ordering = fields
+    if direction == OLDER:
+        ordering = tuple(f'-{field}' for field in fields)
+    return queryset.order_by(*ordering)[:limit]
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по паре (дата публикации, id).
+
+    Страница выбирается условием по ключу крайней записи соседней
+    страницы, а не через OFFSET, поэтому глубокие страницы стоят столько
+    же, сколько первая. Номер страницы и число страниц условные: их
+    достаточно, чтобы has_next/has_previous обычного Page работали
+    без COUNT.
+    """
+    cursor_mode = True
+
+    def __init__(self, object_list, per_page, fields=('pub_date', 'id'),
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.date_field, self.id_field = fields
+        self.has_newer = False
+        self.has_older = False
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    def _check_object_list_is_ordered(self):
+        # Порядок задаётся самим пагинатором по полям ключа.
+        pass
+
+    @property
+    def num_pages(self):
+        return 1 + self.has_newer + self.has_older
+
+    def _key(self, row):
+        return (getattr(row, self.date_field), getattr(row, self.id_field))
+
+    def get_cursor_page(self, cursor=None):
+        direction, key = decode_cursor(cursor)
+        rows = list(keyset_slice(self.object_list, direction, key,
+                                 self.per_page + 1,
+                                 (self.date_field, self.id_field)))
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == OLDER:
+            return self.page_from_rows(rows, key is not None, has_more)
+        if not rows:
+            return self.get_cursor_page()
+        rows.reverse()
+        return self.page_from_rows(rows, has_more, True)
+
+    def page_from_rows(self, rows, has_newer, has_older):
+        """Собирает страницу из уже выбранных строк (от новых к старым)."""
+        self.has_newer = has_newer
+        self.has_older = has_older
+        self.next_cursor = self.previous_cursor = None
+        if rows and self.has_older:
+            self.next_cursor = encode_cursor(OLDER, *self._key(rows[-1]))
+        if rows and self.has_newer:
+            self.previous_cursor = encode_cursor(NEWER, *self._key(rows[0]))
+        return self._get_page(rows, 1 + has_newer, self)
+
+
+class WindowPaginator(Paginator):
+    """Постраничный режим ?page=N без COUNT.
+
+    Страница читается с одной лишней строкой: по ней видно, есть ли
+    следующая. Общее число записей берётся из count, только если его
+    передали (счётчики Counter, Group.post_count, AuthorStats); иначе
+    последняя страница неизвестна и ссылки ограничены окном вокруг
+    текущей.
+    """
+    cursor_mode = False
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+        self.number = 1
+        self.has_more = False
+
+    @property
+    def count(self):
+        if self.known_count is None:
+            # Только для start_index()/end_index(); шаблоны его не читают.
+            self.known_count = super().count
+        return self.known_count
+
+    @property
+    def num_pages(self):
+        reached = self.number + self.has_more
+        if self.known_count is None:
+            return reached
+        # Счётчик может отставать: листать дальше всё равно разрешаем.
+        pages = -(-max(self.known_count - self.orphans, 1) // self.per_page)
+        return max(pages, reached)
+
+    @property
+    def page_window(self):
+        """Номера страниц в окне settings.PAGE_LINKS_WINDOW от текущей."""
+        window = settings.PAGE_LINKS_WINDOW
+        return range(max(1, self.number - window),
+                     min(self.num_pages, self.number + window) + 1)
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('На этой странице нет записей')
+        self.number = number
+        self.has_more = len(rows) > self.per_page
+        return self._get_page(rows[:self.per_page], number, self)
+
+    def get_page(self, number):
+        try:
+            return self.page(number)
+        except PageNotAnInteger:
+            return self.page(1)
+        except EmptyPage:
+            # Номер за концом ленты бывает редко: только здесь считаем
+            # записи по-настоящему, чтобы отдать последнюю страницу.
+            self.known_count = self.object_list.count()
+            self.number, self.has_more = 1, False
+            return self.page(self.num_pages)
@@ -0,0 +1,148 @@
+"""Картинки постов нужного размера по адресу /media/r/<w>x<h>/<имя>.
+
+Первый запрос уменьшает оригинал из post_images и кладёт результат
+в MEDIA_ROOT под тем же путём, что и в адресе, так что дальше файл
+может отдавать и веб-сервер, минуя Django. Разрешены только размеры
+из settings.POST_THUMBNAILS: иначе любой мог бы заставить сервер
+резать картинки под тысячи размеров.
+
+Рядом с копией может лежать её вариант в WebP (<копия>.webp, его пишет
+reencode_media, если он меньше): браузерам, которые принимают WebP,
+отдаётся он.
+
+Файл пишется во временный и переименовывается, поэтому читатели не
+видят его наполовину. Нарезку одного файла несколькими процессами
+сразу предотвращает блокировка: ключ хэшируется в один из
+LOCK_STRIPES файлов-замков, и второй процесс ждёт первого, а затем
+берёт готовый файл.
+"""
+import fcntl
+import hashlib
+import os
+import posixpath
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from .images import ORIENTATION, ROTATED, save_optimized, transpose
+from .storage import post_images
+
+PREFIX = 'r'
+LOCK_STRIPES = 64
+# Форматы, которые сохраняются как есть; остальные — в JPEG.
+KEEP_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+
+def sizes():
+    return set(settings.POST_THUMBNAILS.values())
+
+
+def is_allowed(width, height):
+    return (width, height) in sizes()
+
+
+def resized_name(name, width, height):
+    return posixpath.join(PREFIX, f'{width}x{height}', name)
+
+
+def resized_path(name, width, height):
+    return os.path.join(settings.MEDIA_ROOT, resized_name(name, width, height))
+
+
+def webp_path(path):
+    return path + '.webp'
+
+
+def url(name, width, height):
+    return settings.MEDIA_URL + resized_name(name, width, height)
+
+
+def parse(resized):
+    """(имя оригинала, ширина, высота) по имени уменьшенной копии или
+    None, если это не копия разрешённого размера."""
+    prefix, size, name = (resized.split('/', 2) + ['', ''])[:3]
+    width, _, height = size.partition('x')
+    if (prefix != PREFIX or not name or not width.isdigit()
+            or not height.isdigit()
+            or not is_allowed(int(width), int(height))):
+        return None
+    return name, int(width), int(height)
+
+
+@contextmanager
+def _lock(key):
+    stripe = int(hashlib.md5(key.encode()).hexdigest(), 16) % LOCK_STRIPES
+    directory = os.path.join(settings.MEDIA_ROOT, PREFIX, '.locks')
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, str(stripe)), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _resize(source, target, width, height):
+    with Image.open(source) as image:
+        image_format = image.format
+        # JPEG декодируется сразу уменьшенным, но не меньше рамки; до
+        # поворота по EXIF стороны рамки для него меняются местами.
+        if image.getexif().get(ORIENTATION, 1) in ROTATED:
+            image.draft('RGB', (height, width))
+        else:
+            image.draft('RGB', (width, height))
+        image = ImageOps.fit(transpose(image), (width, height),
+                             Image.LANCZOS)
+    if image_format not in KEEP_FORMATS:
+        image_format = 'JPEG'
+    save_optimized(image, target, image_format)
+
+
+def render(name, width, height):
+    """Путь к копии name размера width x height; режет её, если нет.
+
+    FileNotFoundError, если нет оригинала.
+    """
+    path = resized_path(name, width, height)
+    if os.path.exists(path):
+        return path
+    with _lock(path):
+        # Пока ждали блокировку, копию мог нарезать другой процесс.
+        if os.path.exists(path):
+            return path
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with post_images.open(name) as source:
+            write_atomic(path, lambda target: _resize(source, target,
+                                                      width, height))
+    return path
+
+
+def write_atomic(path, write):
+    """Пишет файл path функцией write(файл) через временный файл."""
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path),
+                                     suffix='.tmp', delete=False) as target:
+        try:
+            write(target)
+        except BaseException:
+            os.remove(target.name)
+            raise
+    os.chmod(target.name, 0o644)
+    os.replace(target.name, path)
+
+
+def exists(name):
+    return all(os.path.exists(resized_path(name, *size)) for size in sizes())
+
+
+def delete(name):
+    """Удаляет копии name всех разрешённых размеров."""
+    for size in sizes():
+        copy = resized_path(name, *size)
+        for path in (copy, webp_path(copy)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
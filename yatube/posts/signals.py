@@ -0,0 +1,141 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.page_cache import purge
+from . import feeds, follow_graph, thumbnails, timeline
+from .feed_cache import bump_generation
+from .models import AuthorStats, Comment, Counter, Follow, Group, Post
+
+_follow_rows = threading.local()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+        feeds.drop_heads([instance.author_id])
+
+
+def forget_unused(name):
+    # Ту же картинку могут показывать и другие посты.
+    if not Post.objects.filter(image=name).exists():
+        thumbnails.forget(name)
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, **kwargs):
+    if not instance.image_changed():
+        return
+    name, old_name = instance.image.name, instance._loaded_image
+    if old_name:
+        transaction.on_commit(lambda: forget_unused(old_name))
+    # Хранилище адресуется содержимым: у повторной загрузки той же
+    # картинки миниатюры уже есть.
+    if (name and not thumbnails.is_pending(name)
+            and not thumbnails.generated(name)):
+        # Файл уже в хранилище, но при откате транзакции миниатюры
+        # были бы мусором: нарезка начнётся только после коммита.
+        pixels = None
+        if instance.image_width:
+            pixels = instance.image_width * instance.image_height
+        transaction.on_commit(
+            lambda: thumbnails.schedule(name, pixels))
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Пост могли загрузить через only()/defer(): после удаления строки
+    # отложенные автор и группа уже не дочитаются, а нужны они счётчикам
+    # и сбросу страниц. Берём их из базы, пока строка на месте.
+    if ('author_id' in instance.__dict__
+            and instance._loaded_group_id is not DEFERRED):
+        return
+    author_id, group_id = Post.objects.filter(pk=instance.pk).values_list(
+        'author_id', 'group_id').get()
+    instance.author_id = author_id
+    instance._loaded_group_id = group_id
+    if 'group_id' not in instance.__dict__:
+        instance.group_id = group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    # post_delete отправляется внутри транзакции удаления,
+    # так что счётчики меняются атомарно вместе со строкой поста.
+    Counter.objects.add(Counter.POSTS, -1)
+    AuthorStats.objects.add_posts(instance.author_id, -1)
+    Group.objects.add_posts(instance._loaded_group_id, -1)
+    feeds.drop_heads([instance.author_id])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # Вместе с постом удаляются и его комментарии: UPDATE уже
+    # удалённой строки ничего не меняет.
+    Post.objects.add_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, [instance.author_id])
+        follow_graph.add(instance.user_id, [instance.author_id])
+
+
+@contextmanager
+def follow_rows_handled():
+    """Внутри блока follow_deleted ничего не делает: удаляющий код
+    сам правит ленту и граф сразу для всех строк."""
+    _follow_rows.handled = True
+    try:
+        yield
+    finally:
+        _follow_rows.handled = False
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if getattr(_follow_rows, 'handled', False):
+        return
+    timeline.prune(instance.user_id, [instance.author_id])
+    follow_graph.remove(instance.user_id, [instance.author_id])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def feed_changed(sender, **kwargs):
+    bump_generation()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_pages_changed(sender, instance, created=False, **kwargs):
+    tags = {f'post:{instance.id}'}
+    # DEFERRED — группу не загружали, и прежней группы пост не менял.
+    tags.update(f'group:{group_id}' for group_id in (
+        instance.group_id, instance._loaded_group_id)
+        if group_id and group_id is not DEFERRED)
+    if created or kwargs['signal'] is post_delete:
+        tags.update(('feed:index', f'author:{instance.author_id}'))
+    purge(tags)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_pages_changed(sender, instance, **kwargs):
+    purge({f'post:{instance.post_id}'})
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_pages_changed(sender, instance, **kwargs):
+    purge({f'group:{instance.id}'})
@@ -0,0 +1,65 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется SHA-256 своего содержимого и лежит в каталоге
+``posts/ab/cd/``: одинаковые картинки (репосты) хранятся один раз,
+и миниатюры, которые называются по имени исходника (posts.resize),
+режутся тоже один раз. Два уровня по 256 каталогов держат листинги
+короткими и на миллионах файлов.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        """Имя файла по его содержимому в каталоге из name."""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = posixpath.dirname(name)
+        if self.is_hashed(name):
+            # Имя уже с шардами (пережатие, перехэширование): новые
+            # шарды встают на их место, а не вкладываются глубже.
+            directory = posixpath.dirname(posixpath.dirname(directory))
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest[2:4],
+                              digest + extension)
+
+    def is_hashed(self, name):
+        return bool(HASHED_NAME.search(name))
+
+    def get_available_name(self, name, max_length=None):
+        # Занятое имя не беда: _save() всё равно заменит его хэшем, а
+        # суффикс от базового класса спрятал бы, что имя уже с шардами.
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Такое содержимое уже лежит под этим именем. Время изменения
+            # обновляется: иначе collect_media --min-age счёл бы файл
+            # старым, пока пост новой загрузки ещё не закоммичен.
+            os.utime(self.path(name))
+            return name
+        # Файл пишется под временным именем и переименовывается:
+        # недописанный файл под хэшем навсегда выдавался бы за целый.
+        temp_name = posixpath.join(posixpath.dirname(name),
+                                   f'{uuid.uuid4().hex}.part')
+        temp_name = super()._save(temp_name, content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+
+post_images = ContentAddressedStorage()
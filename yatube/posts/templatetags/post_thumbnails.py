@@ -0,0 +1,10 @@
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, kind='post'):
+    return thumbnails.post_thumbnail(post, kind)
@@ -1,7 +1,9 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 
-from ..models import Post, User
+from ..models import Group, Post, User
 
 
 class PostCacheTest(TestCase):
@@ -9,16 +11,70 @@ class PostCacheTest(TestCase):
     def setUpClass(cls):
         super().setUpClass()
         cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
 
     def test_index_cache(self):
+        """Фрагмент ленты отдаётся из кэша, пока поколение не изменилось."""
         post = Post.objects.create(
             text='Тестовый пост',
             author=PostCacheTest.author,
         )
         response = self.guest_client.get(reverse('posts:index'))
-        Post.objects.filter(pk=post.pk).delete()
+        # update() не шлёт сигналов: поколение прежнее, фрагмент из кэша.
+        Post.objects.filter(pk=post.pk).update(text='Изменённый пост')
         response2 = self.guest_client.get(reverse('posts:index'))
         self.assertEqual(response.content, response2.content)
+
+    def test_cache_invalidated_on_change(self):
+        """Удаление поста и новый комментарий сразу сбрасывают кэш лент."""
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=PostCacheTest.author,
+            group=PostCacheTest.group,
+        )
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+        ]
+        for url in urls:
+            self.assertContains(self.guest_client.get(url), post.text)
+        post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.guest_client.get(url), post.text)
+
+    def test_cache_is_page_aware(self):
+        """Разные страницы ленты кэшируются под разными ключами."""
+        Post.objects.bulk_create([
+            Post(text=f'Тестовый пост {i}', author=PostCacheTest.author)
+            for i in range(settings.POST_PAGE + 1)
+        ])
+        first = self.guest_client.get(reverse('posts:index'))
+        cursor = first.context['page_obj'].paginator.next_cursor
+        second = self.guest_client.get(
+            reverse('posts:index') + f'?cursor={cursor}')
+        self.assertContains(second, 'Тестовый пост 0')
+        self.assertNotContains(first, 'Тестовый пост 0<')
+
+    def test_cache_key_uses_rendered_page(self):
+        """Битый курсор не кладёт первую страницу под ключ ?page=2."""
+        Post.objects.bulk_create([
+            Post(text=f'Тестовый пост {i}', author=PostCacheTest.author)
+            for i in range(settings.POST_PAGE + 1)
+        ])
+        url = reverse('posts:index')
+        first = self.guest_client.get(url + '?cursor=2')
+        self.assertNotContains(first, 'Тестовый пост 0<')
+        second = self.guest_client.get(url + '?page=2')
+        self.assertContains(second, 'Тестовый пост 0<')
+        self.assertEqual(self.guest_client.get(url).content, first.content)
@@ -0,0 +1,85 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост',
+            author=cls.author,
+            group=cls.group,
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(ConditionalGetTests.reader)
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        ]
+
+    def etags(self):
+        # Первый запрос выдаёт CSRF-cookie, от которой зависит ETag форм.
+        for url in self.urls:
+            self.client.get(url)
+        return {url: self.client.get(url)['ETag'] for url in self.urls}
+
+    def test_not_modified(self):
+        """Повтор с прежним ETag получает 304 без выборки страницы."""
+        for url, etag in self.etags().items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as full:
+                    self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.content)
+                self.assertLess(len(queries), len(full))
+
+    def test_etag_changes(self):
+        """Новый пост, комментарий и правка меняют ETag страниц."""
+        etags = self.etags()
+        Post.objects.create(text='Новый пост', author=self.author,
+                            group=self.group)
+        changed = self.etags()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(etags[url], changed[url])
+        detail = reverse('posts:post_detail',
+                         kwargs={'post_id': self.post.id})
+        etag = changed[detail]
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        self.assertNotEqual(self.client.get(detail)['ETag'], etag)
+        etag = self.client.get(detail)['ETag']
+        self.post.text = 'Изменённый пост'
+        self.post.save()
+        self.assertNotEqual(self.client.get(detail)['ETag'], etag)
+
+    def test_etag_depends_on_reader(self):
+        """ETag различается у разных читателей и у подписки."""
+        profile = self.urls[2]
+        etag = self.client.get(profile)['ETag']
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertNotEqual(self.client.get(profile)['ETag'], etag)
+        self.assertNotEqual(Client().get(profile)['ETag'], etag)
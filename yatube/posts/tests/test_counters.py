@@ -0,0 +1,178 @@
+import warnings
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import AuthorStats, Comment, Counter, Group, Post, User
+
+
+class PostCountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.group_2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test_slug_2',
+            description='Тестовое описание 2',
+        )
+
+    def author_count(self):
+        return AuthorStats.objects.post_count(self.author.id)
+
+    def total_count(self):
+        return Counter.objects.get_value(Counter.POSTS, Post.objects.count)
+
+    def test_create_and_delete(self):
+        """Счётчики растут при создании поста и падают при удалении."""
+        self.assertEqual(self.author_count(), 0)
+        self.assertEqual(self.total_count(), 0)
+        post = Post.objects.create(
+            text='Тестовый пост', author=self.author, group=self.group)
+        Post.objects.create(text='Тестовый пост 2', author=self.author)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+        self.assertEqual(self.author_count(), 2)
+        self.assertEqual(self.total_count(), 2)
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 0)
+        self.assertEqual(self.author_count(), 1)
+        self.assertEqual(self.total_count(), 1)
+
+    def test_delete_deferred(self):
+        """Пост, загруженный через only()/defer(), удаляется без ошибок
+        и со счётчиками."""
+        for i, queryset in enumerate((Post.objects.defer('group'),
+                                      Post.objects.only('text'))):
+            with self.subTest(i=i):
+                post = Post.objects.create(
+                    text='Тестовый пост', author=self.author,
+                    group=self.group)
+                with warnings.catch_warnings():
+                    warnings.simplefilter('error', CacheKeyWarning)
+                    queryset.get(pk=post.pk).delete()
+                self.group.refresh_from_db()
+                self.assertEqual(self.group.post_count, 0)
+                self.assertEqual(self.author_count(), 0)
+                self.assertEqual(self.total_count(), 0)
+
+    def test_group_change(self):
+        """Смена группы переносит пост между счётчиками групп."""
+        post = Post.objects.create(
+            text='Тестовый пост', author=self.author, group=self.group)
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.group_2
+        post.save()
+        post.group = None
+        post.save()
+        self.group.refresh_from_db()
+        self.group_2.refresh_from_db()
+        self.assertEqual(self.group.post_count, 0)
+        self.assertEqual(self.group_2.post_count, 0)
+
+    def test_group_change_with_deferred_group(self):
+        """Пост, загруженный без группы, не сбивает счётчики групп."""
+        post = Post.objects.create(
+            text='Тестовый пост', author=self.author, group=self.group)
+        post = Post.objects.defer('group').get(pk=post.pk)
+        post.text = 'Правка'
+        post.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+        post = Post.objects.only('text').get(pk=post.pk)
+        post.group = self.group_2
+        post.save()
+        self.group.refresh_from_db()
+        self.group_2.refresh_from_db()
+        self.assertEqual(self.group.post_count, 0)
+        self.assertEqual(self.group_2.post_count, 1)
+
+    def test_recount_command(self):
+        """recount_posts исправляет счётчики после массовой вставки."""
+        self.author_count()
+        self.total_count()
+        Post.objects.bulk_create([
+            Post(text=f'Пост {i}', author=self.author, group=self.group)
+            for i in range(5)
+        ])
+        call_command('recount_posts', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 5)
+        self.assertEqual(self.author_count(), 5)
+        self.assertEqual(self.total_count(), 5)
+
+
+class CommentCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def comment_count(self):
+        return Post.objects.values_list('comment_count', flat=True).get(
+            pk=self.post.pk)
+
+    def test_add_and_delete(self):
+        """Счётчик растёт с add_comment и падает при удалении."""
+        client = Client()
+        client.force_login(self.author)
+        for text in ('Первый', 'Второй'):
+            client.post(reverse('posts:add_comment',
+                                kwargs={'post_id': self.post.pk}),
+                        {'text': text})
+        self.assertEqual(self.comment_count(), 2)
+        Comment.objects.filter(text='Первый').delete()
+        self.assertEqual(self.comment_count(), 1)
+
+    def test_edit_keeps_count(self):
+        """Сохранение поста, прочитанного до комментария, не затирает
+        счётчик."""
+        stale = Post.objects.get(pk=self.post.pk)
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Комментарий')
+        stale.text = 'Правка'
+        stale.save()
+        self.assertEqual(self.comment_count(), 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).text, 'Правка')
+
+    def test_feed_without_per_post_queries(self):
+        """Карточки ленты показывают счётчик без запросов на пост."""
+        def queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                response = Client().get(reverse('posts:index'))
+            return response, len(captured)
+
+        Counter.objects.get_value(Counter.POSTS, Post.objects.count)
+        _, single = queries()
+        for i in range(5):
+            post = Post.objects.create(text=f'Пост {i}', author=self.author)
+            Comment.objects.create(post=post, author=self.author,
+                                   text='Комментарий')
+        response, many = queries()
+        self.assertEqual(many, single)
+        self.assertContains(response, 'Комментариев: 1', count=5)
+
+    def test_recount_command(self):
+        """recount_posts исправляет разошедшиеся счётчики комментариев."""
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.author, text=f'К {i}')
+            for i in range(3)
+        ])
+        out = StringIO()
+        call_command('recount_posts', stdout=out)
+        self.assertEqual(self.comment_count(), 3)
+        self.assertIn('счётчиков комментариев: 1', out.getvalue())
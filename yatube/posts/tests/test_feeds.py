@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Post, User
+
+
+@override_settings(FOLLOW_FEED_ENGINE='merge', AUTHOR_HEAD_LENGTH=8)
+class MergedFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [User.objects.create_user(username=f'author_{i}')
+                       for i in range(3)]
+        for i in range(12):
+            for author in cls.authors[:i % 3 + 1]:
+                Post.objects.create(text=f'Пост {i}', author=author)
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(MergedFeedTests.reader)
+
+    def walk(self, url):
+        seen = []
+        cursor = ''
+        while True:
+            response = self.reader_client.get(url + cursor)
+            page_obj = response.context['page_obj']
+            seen.extend(page_obj)
+            if not page_obj.has_next():
+                return seen
+            cursor = f'?cursor={page_obj.paginator.next_cursor}'
+
+    def test_follow_feed_matches_database(self):
+        """Слияние голов даёт ту же ленту, что и запрос к базе,
+        в том числе глубже горизонта голов."""
+        expected = list(Post.objects.filter(
+            author__in=self.authors[:2]).order_by('-pub_date', '-id'))
+        self.assertGreater(len(expected), settings.AUTHOR_HEAD_LENGTH)
+        self.assertEqual(self.walk(reverse('posts:follow_index')), expected)
+
+    def test_deep_page_in_constant_queries(self):
+        """Глубже голов отрезки всех авторов читаются одним запросом."""
+        Follow.objects.create(user=self.reader, author=self.authors[2])
+        expected = list(Post.objects.filter(
+            author__in=self.authors).order_by('-pub_date', '-id'))
+        url = reverse('posts:follow_index')
+        self.assertEqual(self.walk(url), expected)
+        cursor = self.reader_client.get(url).context[
+            'page_obj'].paginator.next_cursor
+        # Вторая страница уже глубже голов из восьми постов.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(f'{url}?cursor={cursor}')
+        self.assertEqual(list(response.context['page_obj']),
+                         expected[10:20])
+        post_queries = [query['sql'] for query in queries
+                        if '"posts_post"' in query['sql']]
+        self.assertEqual(len(post_queries), 2, '\n'.join(post_queries))
+        self.assertIn('ROW_NUMBER()', post_queries[0])
+
+    def test_profile_first_page_from_head(self):
+        """Первая страница профиля собирается из головы автора
+        одним in_bulk, без сортировки постов в базе."""
+        author = self.authors[2]
+        url = reverse('posts:profile', kwargs={'username': author.username})
+        self.reader_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(url)
+        post_queries = [query['sql'] for query in queries
+                        if 'FROM "posts_post"' in query['sql']]
+        self.assertEqual(len(post_queries), 1)
+        self.assertIn('"posts_post"."id" IN', post_queries[0])
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(author.posts.order_by('-pub_date', '-id')))
+
+    def test_new_post_resets_head(self):
+        """Новый пост сразу виден в ленте, собранной из голов."""
+        self.reader_client.get(reverse('posts:follow_index'))
+        post = Post.objects.create(text='Свежий пост', author=self.authors[1])
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
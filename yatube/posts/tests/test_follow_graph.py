@@ -0,0 +1,254 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import follow_graph
+from ..models import Follow, Post, TimelineEntry, User
+
+CACHE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [User.objects.create_user(username=f'author_{i}')
+                       for i in range(3)]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow(self, author):
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': author.username}))
+
+    def test_lazy_load(self):
+        """Списки читаются из базы один раз, дальше — из кэша."""
+        for author in reversed(self.authors[1:]):
+            Follow.objects.create(user=self.reader, author=author)
+        with self.assertNumQueries(1):
+            followees = follow_graph.followees(self.reader.id)
+        self.assertEqual(list(followees),
+                         sorted(author.id for author in self.authors[1:]))
+        with self.assertNumQueries(0):
+            self.assertTrue(follow_graph.is_following(
+                self.reader.id, self.authors[2].id))
+            self.assertFalse(follow_graph.is_following(
+                self.reader.id, self.authors[0].id))
+            self.assertFalse(follow_graph.is_following(
+                None, self.authors[0].id))
+
+    def test_follow_and_unfollow(self):
+        """Подписка и отписка правят закэшированные списки."""
+        follow_graph.followees(self.reader.id)
+        follow_graph.followers(self.authors[0].id)
+        self.follow(self.authors[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(list(follow_graph.followees(self.reader.id)),
+                             [self.authors[0].id])
+            self.assertEqual(list(follow_graph.followers(
+                self.authors[0].id)), [self.reader.id])
+        self.client.get(reverse('posts:profile_unfollow', kwargs={
+            'username': self.authors[0].username}))
+        with self.assertNumQueries(0):
+            self.assertEqual(list(follow_graph.followees(self.reader.id)),
+                             [])
+            self.assertEqual(list(follow_graph.followers(
+                self.authors[0].id)), [])
+
+    def test_profile_without_follow_sql(self):
+        """Страница автора узнаёт о подписке без запроса к Follow."""
+        self.follow(self.authors[0])
+        follow_graph.followees(self.reader.id)
+        url = reverse('posts:profile',
+                      kwargs={'username': self.authors[0].username})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertTrue(response.context['following'])
+        self.assertFalse([query for query in queries
+                          if '"posts_follow"' in query['sql']])
+
+    def test_own_follow_on_stale_worker(self):
+        """Воркер со старым графом видит подписку читателя сразу: список,
+        загруженный до неё, перечитывается из базы один раз."""
+        self.follow(self.authors[0])
+        # Граф воркера, который подписку не обрабатывал.
+        changed = float(self.client.cookies[follow_graph.CHANGED_COOKIE].value)
+        cache.set_many({
+            follow_graph.FOLLOWEES_KEY.format(self.reader.id): b'',
+            follow_graph.LOADED_KEY.format(self.reader.id): changed - 1,
+        })
+        url = reverse('posts:profile',
+                      kwargs={'username': self.authors[0].username})
+        response = self.client.get(url)
+        self.assertTrue(response.context['following'])
+        self.assertTrue(follow_graph.is_following(
+            self.reader.id, self.authors[0].id))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([query for query in queries
+                          if '"posts_follow"' in query['sql']])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    }})
+    def test_check_command(self):
+        """check_follow_graph находит и чинит разошедшиеся списки."""
+        cache.clear()
+        follow_graph.followees(self.reader.id)
+        # Строка без сигналов: кэш о ней не знает.
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.authors[1])])
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('check_follow_graph', stdout=out)
+        self.assertIn('Расходится подписок: 1', out.getvalue())
+        call_command('check_follow_graph', '--fix', stdout=StringIO())
+        self.assertTrue(follow_graph.is_following(
+            self.reader.id, self.authors[1].id))
+        call_command('check_follow_graph', stdout=StringIO())
+
+    def test_check_command_needs_shared_cache(self):
+        """С LocMemCache команде не виден кэш веб-процессов."""
+        with self.assertRaisesMessage(CommandError, 'LocMemCache'):
+            call_command('check_follow_graph', stdout=StringIO())
+
+    def test_check_view(self):
+        """Персонал сверяет и чинит граф внутри веб-процесса."""
+        url = reverse('posts:follow_graph_check')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        follow_graph.followees(self.reader.id)
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.authors[1])])
+        self.assertEqual(self.client.get(url).json()['followees'], 1)
+        self.assertEqual(self.client.post(url).json(), {
+            'followees': 1, 'followers': 0, 'fixed': True,
+            'pid': os.getpid()})
+        self.assertTrue(follow_graph.is_following(
+            self.reader.id, self.authors[1].id))
+        self.assertEqual(self.client.get(url).json()['followees'], 0)
+
+
+class BulkFollowTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [User.objects.create_user(username=f'author_{i}')
+                       for i in range(50)]
+        for author in cls.authors:
+            Post.objects.create(author=author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.usernames = [author.username for author in self.authors]
+
+    def test_follow_many_in_constant_queries(self):
+        """Подписка на 50 авторов — постоянное число запросов, лента
+        и граф подписок обновлены."""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        follow_graph.followees(self.reader.id)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('posts:bulk_follow'), {
+                'usernames': ' '.join(self.usernames + ['ghost', 'reader'])})
+        self.assertLess(len(queries), 15)
+        data = response.json()
+        self.assertEqual(len(data['followed']), 49)
+        self.assertEqual(data['missing'], ['ghost'])
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 50)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 50)
+        self.assertEqual(len(follow_graph.followees(self.reader.id)), 50)
+        again = self.client.post(reverse('posts:bulk_follow'),
+                                 {'username': self.usernames[:2]}).json()
+        self.assertEqual(again['followed'], [])
+
+    def test_unfollow_many(self):
+        """Массовая отписка убирает подписки, ленту и рёбра графа
+        постоянным числом запросов."""
+        self.client.post(reverse('posts:bulk_follow'),
+                         {'usernames': ','.join(self.usernames)})
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.post(reverse('posts:bulk_unfollow'), {
+                'username': self.usernames[2:]}).json()
+        self.assertLess(len(queries), 10)
+        self.assertEqual(data['unfollowed'], sorted(self.usernames[2:]))
+        self.assertEqual(sorted(follow_graph.followees(self.reader.id)),
+                         sorted(author.id for author in self.authors[:2]))
+        self.assertEqual(
+            list(follow_graph.followers(self.authors[2].id)), [])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+
+    def test_unfollow_many_keeps_signals(self):
+        """Массовая отписка шлёт post_delete по строке; гасится только
+        построчная правка ленты и графа."""
+        # Запросов мало, пока на Follow никто не ссылается: появится
+        # связь — проверьте число запросов unfollow_many.
+        self.assertEqual(Follow._meta.related_objects, ())
+        self.client.post(reverse('posts:bulk_follow'),
+                         {'usernames': ','.join(self.usernames[:3])})
+        deleted = []
+
+        def receiver(sender, instance, **kwargs):
+            deleted.append(instance.author_id)
+
+        post_delete.connect(receiver, sender=Follow)
+        try:
+            self.client.post(reverse('posts:bulk_unfollow'),
+                             {'username': self.usernames[:3]})
+        finally:
+            post_delete.disconnect(receiver, sender=Follow)
+        self.assertEqual(sorted(deleted),
+                         sorted(author.id for author in self.authors[:3]))
+        # После массовой отписки одиночная снова правит ленту.
+        Follow.objects.create(user=self.reader, author=self.authors[3])
+        self.client.get(reverse('posts:profile_unfollow', kwargs={
+            'username': self.usernames[3]}))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader, author=self.authors[3]).exists())
+
+    @override_settings(BULK_FOLLOW_LIMIT=10)
+    def test_limit_and_method(self):
+        """Слишком длинный список — 400, GET — 405."""
+        response = self.client.post(reverse('posts:bulk_follow'),
+                                    {'username': self.usernames[:11]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            self.client.get(reverse('posts:bulk_follow')).status_code, 405)
+
+    def test_command(self):
+        """follow_authors подписывает и отписывает пачками."""
+        out = StringIO()
+        call_command('follow_authors', 'reader', *self.usernames[:3],
+                     'ghost', batch_size=2, stdout=out, stderr=StringIO())
+        self.assertIn('Подписано: 3, не найдено: 1', out.getvalue())
+        call_command('follow_authors', 'reader', *self.usernames[:2],
+                     unfollow=True, stdout=StringIO())
+        self.assertEqual(list(Follow.objects.filter(
+            user=self.reader).values_list('author_id', flat=True)),
+            [self.authors[2].id])
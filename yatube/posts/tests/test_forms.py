@@ -1,11 +1,15 @@
+import hashlib
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..models import Group, Post, User
 from ..forms import PostForm
@@ -53,6 +57,7 @@ class ViewsFormsTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.author_client = Client()
         self.author_client.force_login(ViewsFormsTests.user_author)
@@ -76,6 +81,9 @@ class ViewsFormsTests(TestCase):
             content=small_gif_2,
             content_type='image/gif'
         )
+        # Картинка сохраняется под SHA-256 своего содержимого.
+        digest = hashlib.sha256(small_gif_2).hexdigest()
+        image_name = f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
         form_data = {
             'text': 'Самый новый пост',
             'group': self.group.pk,
@@ -93,21 +101,21 @@ class ViewsFormsTests(TestCase):
         # картинка появляется на страницах
         response1 = self.author_client.get(reverse('posts:index'))
         self.assertEqual(
-            response1.context['page_obj'][0].image, f'posts/{uploaded_2.name}')
+            response1.context['page_obj'][0].image, image_name)
         response2 = self.author_client.get(reverse('posts:group_list',
                                            kwargs={'slug': 'test_slug'}))
         self.assertEqual(
             response2.context.get('page_obj'
-                                  )[0].image, f'posts/{uploaded_2.name}')
+                                  )[0].image, image_name)
         response3 = self.author_client.get(reverse('posts:profile',
                                            kwargs={
                                                'username': self.user_author}))
         self.assertEqual(
-            response3.context['page_obj'][0].image, f'posts/{uploaded_2.name}')
+            response3.context['page_obj'][0].image, image_name)
         response4 = self.author_client.get(reverse('posts:post_detail',
                                            kwargs={'post_id': 2}))
         self.assertEqual(
-            response4.context['post'].image, f'posts/{uploaded_2.name}')
+            response4.context['post'].image, image_name)
 
     def test_post_edit(self):
         """при отправке валидной формы со страницы редактирования поста
@@ -185,3 +193,81 @@ class ViewsFormsTests(TestCase):
         )
         self.assertFalse(response.context.get('is_edit'))
         self.assertEqual(Post.objects.count(), posts_count)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIDE=16)
+class ImageIngestionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, size, image_format='JPEG', name='big.jpg'):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'teal').save(buffer, image_format)
+        return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+    def test_large_image_downscaled(self):
+        """Картинка больше POST_IMAGE_MAX_SIDE уменьшается до сохранения."""
+        form = PostForm(data={'text': 'Пост'},
+                        files={'image': self.upload((64, 32))})
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        post.author = self.user
+        post.save()
+        self.assertEqual((post.image_width, post.image_height), (16, 8))
+        with Image.open(post.image.path) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (16, 8)))
+
+    def test_small_image_kept(self):
+        """Картинка в пределах лимита сохраняется байт в байт."""
+        upload = self.upload((8, 4), 'PNG', 'small.png')
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIs(form.cleaned_data['image'], upload)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_pixel_limit(self):
+        """Картинка больше лимита пикселей отклоняется до декодирования."""
+        form = PostForm(data={'text': 'Пост'},
+                        files={'image': self.upload((64, 32))})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def test_exif_orientation_applied(self):
+        """Снимок с поворотом в EXIF сохраняется уже повёрнутым."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        Image.new('RGB', (64, 32), 'teal').save(buffer, 'JPEG', exif=exif)
+        upload = SimpleUploadedFile('phone.jpg', buffer.getvalue(),
+                                    'image/jpeg')
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (8, 16))
+            self.assertNotIn(0x0112, image.getexif())
+
+    @override_settings(POST_IMAGE_MAX_DECODE_PIXELS=1000)
+    def test_decode_pixel_limit(self):
+        """Для форматов без draft() лимит пикселей ниже, чем для JPEG."""
+        form = PostForm(data={'text': 'Пост'},
+                        files={'image': self.upload((64, 32))})
+        self.assertTrue(form.is_valid(), form.errors)
+        form = PostForm(data={'text': 'Пост'}, files={
+            'image': self.upload((64, 32), 'PNG', 'big.png')})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(POST_IMAGE_MAX_BYTES=10)
+    def test_size_limit(self):
+        """Файл тяжелее POST_IMAGE_MAX_BYTES отклоняется."""
+        form = PostForm(data={'text': 'Пост'},
+                        files={'image': self.upload((8, 4))})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
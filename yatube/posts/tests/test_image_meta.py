@@ -0,0 +1,78 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..images import EMPTY_META
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageMetaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=ImageMetaTests.author,
+            text='Тестовый пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def test_meta_on_upload(self):
+        """Размеры, вес и заглушка считаются при загрузке картинки."""
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,'))
+        self.assertEqual(post.image.read(), SMALL_GIF)
+
+    def test_unreadable_image(self):
+        """Несуществующий файл оставляет сведения пустыми."""
+        post = Post.objects.create(author=self.author, text='Без файла',
+                                   image='posts/missing.jpg')
+        for field, value in EMPTY_META.items():
+            self.assertEqual(getattr(post, field), value)
+
+    def test_templates_emit_size(self):
+        """Шаблон отдаёт размеры картинки и ленивую загрузку."""
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, self.post.image_placeholder)
+
+    def test_backfill(self):
+        """Команда заполняет сведения у постов, загруженных без них."""
+        Post.objects.update(**EMPTY_META)
+        out = StringIO()
+        call_command('backfill_image_meta', workers=1, stdout=out)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_placeholder, self.post.image_placeholder)
+        self.assertIn('Обработано постов: 1', out.getvalue())
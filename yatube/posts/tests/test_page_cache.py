@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.detail_url = reverse('posts:post_detail',
+                                  kwargs={'post_id': self.post.id})
+
+    def assert_cache(self, url, status):
+        self.assertEqual(self.guest_client.get(url)['X-Cache'], status)
+
+    def test_hit_after_miss(self):
+        """Повторный анонимный запрос страницы отдаётся из кэша."""
+        self.assert_cache(self.detail_url, 'MISS')
+        self.assert_cache(self.detail_url, 'HIT')
+
+    def test_purge_only_affected_pages(self):
+        """Новый пост другого автора сбрасывает главную, но не чужой пост;
+        комментарий сбрасывает страницу своего поста."""
+        index_url = reverse('posts:index')
+        for url in (index_url, self.detail_url):
+            self.assert_cache(url, 'MISS')
+        Post.objects.create(text='Другой пост', author=self.other)
+        self.assert_cache(index_url, 'MISS')
+        self.assert_cache(self.detail_url, 'HIT')
+        Comment.objects.create(post=self.post, author=self.other,
+                               text='Комментарий')
+        self.assert_cache(self.detail_url, 'MISS')
+
+    def test_group_change_purges_group_feed(self):
+        """Правка группы сбрасывает её ленту."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.assert_cache(url, 'MISS')
+        self.group.description = 'Новое описание'
+        self.group.save()
+        self.assert_cache(url, 'MISS')
+
+    def test_authenticated_not_cached(self):
+        """Авторизованным пользователям страницы не кэшируются."""
+        client = Client()
+        client.force_login(self.author)
+        client.get(self.detail_url)
+        self.assertFalse(client.get(self.detail_url).has_header('X-Cache'))
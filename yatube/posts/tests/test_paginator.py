@@ -0,0 +1,128 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post, User
+from ..paginator import CursorPaginator, WindowPaginator
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.number_of_posts = settings.POST_PAGE * 2 + 3
+        Post.objects.bulk_create([
+            Post(text=f'Тестовый пост {i}', author=cls.author)
+            for i in range(cls.number_of_posts)
+        ])
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_walk_older_and_newer(self):
+        """Курсоры проходят ленту вглубь и обратно без пропусков."""
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        seen = []
+        cursors = [None]
+        while True:
+            paginator = CursorPaginator(Post.objects.all(), settings.POST_PAGE)
+            page = paginator.get_cursor_page(cursors[-1])
+            seen.extend(page)
+            if not page.has_next():
+                break
+            cursors.append(paginator.next_cursor)
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(cursors), 3)
+        self.assertEqual(len(page), 3)
+
+        paginator = CursorPaginator(Post.objects.all(), settings.POST_PAGE)
+        page = paginator.get_cursor_page(cursors[-1])
+        newer = CursorPaginator(Post.objects.all(), settings.POST_PAGE)
+        newer_page = newer.get_cursor_page(paginator.previous_cursor)
+        self.assertEqual(
+            list(newer_page),
+            expected[settings.POST_PAGE:settings.POST_PAGE * 2])
+        self.assertTrue(newer_page.has_previous())
+        self.assertTrue(newer_page.has_next())
+
+    def test_feed_uses_cursor(self):
+        """Лента без ?page= отдаёт keyset-страницу и ссылку на старые."""
+        response = self.guest_client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.paginator.cursor_mode)
+        self.assertFalse(page_obj.has_previous())
+        self.assertContains(
+            response, f'?cursor={page_obj.paginator.next_cursor}')
+
+    def test_broken_cursor(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:index') + '?cursor=garbage')
+        self.assertEqual(len(response.context['page_obj']), settings.POST_PAGE)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
+@override_settings(PAGE_LINKS_WINDOW=1)
+class WindowPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.number_of_posts = settings.POST_PAGE * 4 + 3
+        for i in range(cls.number_of_posts):
+            Post.objects.create(text=f'Тестовый пост {i}', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_pages_without_count(self):
+        """Номерные страницы ленты не выполняют COUNT."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                # Первый запрос один раз заводит счётчики по данным.
+                self.guest_client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(url + '?page=3')
+                self.assertFalse([query['sql'] for query in queries
+                                  if 'COUNT(' in query['sql']
+                                  and '"posts_post"' in query['sql']])
+                page_obj = response.context['page_obj']
+                self.assertEqual(list(page_obj.paginator.page_window),
+                                 [2, 3, 4])
+                self.assertContains(response, '?page=5')
+                self.assertNotContains(response, '?page=1">1</a>')
+
+    def test_unknown_count(self):
+        """Без известного числа записей виден только следующий номер."""
+        posts = Post.objects.order_by('-pub_date', '-id')
+        paginator = WindowPaginator(posts, settings.POST_PAGE)
+        page = paginator.get_page(2)
+        self.assertTrue(page.has_next())
+        self.assertEqual(paginator.num_pages, 3)
+        self.assertEqual(list(paginator.page_window), [1, 2, 3])
+        self.assertIsNone(paginator.known_count)
+        last = paginator.get_page(5)
+        self.assertFalse(last.has_next())
+        self.assertEqual(len(last), 3)
+
+    def test_out_of_range_and_stale_count(self):
+        """За концом ленты — последняя страница; счётчик может отставать."""
+        posts = Post.objects.order_by('-pub_date', '-id')
+        paginator = WindowPaginator(posts, settings.POST_PAGE)
+        self.assertEqual(paginator.get_page(100).number, 5)
+        paginator = WindowPaginator(posts, settings.POST_PAGE, count=15)
+        page = paginator.get_page(2)
+        self.assertTrue(page.has_next())
+        self.assertEqual(paginator.get_page('garbage').number, 1)
+        paginator = WindowPaginator(posts, settings.POST_PAGE, count=1000)
+        self.assertEqual(paginator.get_page(50).number, 5)
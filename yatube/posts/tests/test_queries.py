@@ -0,0 +1,153 @@
+import shutil
+import tempfile
+
+from about import urls as about_urls
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from users import urls as users_urls
+
+from .. import urls as posts_urls
+from ..models import AuthorStats, Comment, Counter, Follow, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+# Потолок числа SQL-запросов на один GET (гость, авторизованный).
+# None — страница доступна только после входа.
+QUERY_BUDGETS = {
+    'posts:index': (5, 7),
+    'posts:group_list': (5, 7),
+    'posts:profile': (7, 10),
+    'posts:post_detail': (5, 7),
+    'posts:post_edit': (None, 4),
+    'posts:post_create': (None, 3),
+    'posts:add_comment': (None, 3),
+    'posts:post_comments': (2, 4),
+    'posts:follow_index': (None, 5),
+    'posts:profile_follow': (None, 10),
+    'posts:profile_unfollow': (None, 6),
+    'posts:bulk_follow': (None, 2),
+    'posts:bulk_unfollow': (None, 2),
+    'posts:follow_graph_check': (None, 2),
+    'posts:resized_image': (0, 2),
+    'users:logout': (0, 4),
+    'users:signup': (0, 2),
+    'users:login': (0, 2),
+    'users:password_change_form': (None, 2),
+    'users:password_change_done': (None, 2),
+    'users:password_reset_form': (0, 2),
+    'users:password_reset_done': (0, 2),
+    'users:password_reset_complete': (0, 2),
+    'about:author': (0, 2),
+    'about:tech': (0, 2),
+}
+# Маршрут записан регулярным выражением внутри path() и совпадает
+# только с буквальной строкой; ссылки из писем обслуживает
+# django.contrib.auth.urls, поэтому здесь он не измеряется.
+SKIPPED = {'users:password_reset_confirm'}
+# Суммарное время SQL на один запрос страницы, секунд.
+SQL_TIME_BUDGET = 0.25
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.authors = [cls.author] + [
+            User.objects.create_user(username=f'author_{i}')
+            for i in range(4)
+        ]
+        groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'group_{i}',
+                                 description='Тестовое описание')
+            for i in range(3)
+        ]
+        for i in range(60):
+            image = None
+            if i % 7 == 0:
+                image = SimpleUploadedFile(name=f'small_{i}.gif',
+                                           content=SMALL_GIF,
+                                           content_type='image/gif')
+            Post.objects.create(
+                text=f'Тестовый пост {i}',
+                author=cls.authors[i % len(cls.authors)],
+                group=groups[i % len(groups)] if i % 4 else None,
+                image=image,
+            )
+        cls.post = cls.author.posts.exclude(image='').first()
+        for i in range(30):
+            Comment.objects.create(post=cls.post,
+                                   author=cls.authors[i % len(cls.authors)],
+                                   text=f'Комментарий {i}')
+        for author in cls.authors[1:4]:
+            Follow.objects.create(user=cls.author, author=author)
+        # Ленивые счётчики создаются при первом чтении — не в замере.
+        Counter.objects.get_value(Counter.POSTS, Post.objects.count)
+        for author in cls.authors:
+            AuthorStats.objects.post_count(author.id)
+        cls.kwargs = {
+            'posts:group_list': {'slug': 'group_1'},
+            'posts:profile': {'username': cls.author.username},
+            'posts:resized_image': dict(zip(
+                ('width', 'height'), settings.POST_THUMBNAILS['post']),
+                name=cls.post.image.name),
+            'posts:post_detail': {'post_id': cls.post.id},
+            'posts:post_edit': {'post_id': cls.post.id},
+            'posts:add_comment': {'post_id': cls.post.id},
+            'posts:post_comments': {'post_id': cls.post.id},
+            'posts:profile_follow': {'username': cls.authors[4].username},
+            'posts:profile_unfollow': {'username': cls.authors[1].username},
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def url_names(self):
+        for module in (posts_urls, users_urls, about_urls):
+            for pattern in module.urlpatterns:
+                yield f'{module.app_name}:{pattern.name}'
+
+    def measure(self, url, user=None):
+        cache.clear()
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        return queries
+
+    def test_every_url_has_budget(self):
+        """Для каждого маршрута posts, users и about задан бюджет."""
+        self.assertEqual(set(self.url_names()) - SKIPPED, set(QUERY_BUDGETS))
+
+    def test_query_budgets(self):
+        """Страницы укладываются в бюджет по числу и времени запросов."""
+        for name, budgets in QUERY_BUDGETS.items():
+            url = reverse(name, kwargs=self.kwargs.get(name))
+            for user, budget in zip((None, self.author), budgets):
+                if budget is None:
+                    continue
+                with self.subTest(url=url, user=user):
+                    queries = self.measure(url, user)
+                    sql = '\n'.join(query['sql'] for query in queries)
+                    self.assertLessEqual(len(queries), budget, sql)
+                    self.assertLessEqual(
+                        sum(float(query['time']) for query in queries),
+                        SQL_TIME_BUDGET)
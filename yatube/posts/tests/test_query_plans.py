@@ -0,0 +1,118 @@
+import unittest
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+FEED_TABLES = ('posts_post', 'posts_timelineentry', 'posts_comment',
+               'posts_follow')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite',
+                     'EXPLAIN QUERY PLAN есть только в SQLite')
+@override_settings(AUTHOR_HEAD_LENGTH=5)
+class FeedQueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        authors = [cls.author] + [
+            User.objects.create_user(username=f'author_{i}')
+            for i in range(3)
+        ]
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        for i in range(settings.POST_PAGE * 3):
+            Post.objects.create(text=f'Пост {i}',
+                                author=authors[i % len(authors)],
+                                group=cls.group if i % 2 else None)
+        cls.post = Post.objects.first()
+        for i in range(5):
+            Comment.objects.create(post=cls.post, author=cls.reader,
+                                   text=f'Комментарий {i}')
+        for author in authors[:3]:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(FeedQueryPlanTests.reader)
+
+    def feed_queries(self, url):
+        """SELECT-запросы к таблицам лент при обходе трёх страниц url."""
+        captured = []
+        cursor = ''
+        for _ in range(3):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url + cursor)
+            captured.extend(queries)
+            page_obj = response.context['page_obj']
+            if not getattr(page_obj.paginator, 'next_cursor', None):
+                break
+            cursor = f'?cursor={page_obj.paginator.next_cursor}'
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url + '?page=2')
+        captured.extend(queries)
+        return [query['sql'] for query in captured
+                if query['sql'].startswith('SELECT')
+                and any(f'"{table}"' in query['sql']
+                        for table in FEED_TABLES)]
+
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, queries):
+        self.assertTrue(queries)
+        for sql in queries:
+            plan = self.query_plan(sql)
+            with self.subTest(sql=sql, plan=plan):
+                for step in plan:
+                    self.assertNotIn('TEMP B-TREE', step)
+                    # Обход подзапроса (окна) читает его результат,
+                    # а не таблицу.
+                    if (step.startswith('SCAN')
+                            and not step.startswith('SCAN (subquery')):
+                        self.assertIn('INDEX', step)
+
+    def test_feeds_use_indexes(self):
+        """Запросы лент читают индекс и не сортируют во временном B-дереве."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assert_indexed(self.feed_queries(url))
+
+    @override_settings(FOLLOW_FEED_ENGINE='merge')
+    def test_merged_follow_feed_uses_indexes(self):
+        """Лента подписок на головах авторов тоже обходится индексами."""
+        self.assert_indexed(self.feed_queries(reverse('posts:follow_index')))
+
+    @override_settings(COMMENTS_PAGE=2)
+    def test_comments_use_index(self):
+        """Комментарии поста и их следующие порции читаются по индексу
+        (post, created)."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.id}))
+            self.client.get(
+                reverse('posts:post_comments',
+                        kwargs={'post_id': self.post.id}),
+                {'cursor': response.context['comments_next']})
+        self.assert_indexed([query['sql'] for query in queries
+                             if '"posts_comment"' in query['sql']])
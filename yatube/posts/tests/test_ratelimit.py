@@ -0,0 +1,126 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import ratelimit
+from ..models import Comment, Post, User
+
+CACHE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(RATE_LIMITS={'comment': (3, 60), 'post': (3, 60),
+                                'signup': (2, 60), 'login': (2, 60)})
+class RateLimitTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.comment_url = reverse('posts:add_comment',
+                                   kwargs={'post_id': self.post.id})
+
+    def comment(self, client, ip='10.0.0.1'):
+        return client.post(self.comment_url, {'text': 'Спам'},
+                           REMOTE_ADDR=ip)
+
+    def test_bucket(self):
+        """Ведро пропускает burst запросов подряд и пополняется со
+        временем: по токену в секунду при rate=60."""
+        with mock.patch.object(ratelimit, '_now', return_value=10 ** 6):
+            waits = [ratelimit.take('comment', 'ip', 'a') for _ in range(4)]
+            self.assertEqual(waits[:3], [0, 0, 0])
+            self.assertEqual(waits[3], 1000)
+            # Отказ не тратит токен.
+            self.assertEqual(ratelimit.take('comment', 'ip', 'a'), 1000)
+            self.assertEqual(ratelimit.take('comment', 'ip', 'b'), 0)
+        with mock.patch.object(ratelimit, '_now',
+                               return_value=10 ** 6 + 1000):
+            self.assertEqual(ratelimit.take('comment', 'ip', 'a'), 0)
+            self.assertTrue(ratelimit.take('comment', 'ip', 'a'))
+
+    def test_comment_flood(self):
+        """Лишние комментарии получают 429 без обращения к базе."""
+        for _ in range(3):
+            self.assertEqual(self.comment(self.client).status_code, 302)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.comment(self.client)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertFalse([query for query in queries
+                          if 'posts_' in query['sql']
+                          or 'auth_user' in query['sql']])
+        self.assertEqual(Comment.objects.count(), 3)
+
+    def test_user_and_ip_buckets(self):
+        """Пользователь не обходит лимит сменой IP, а у других
+        пользователей свои вёдра."""
+        for i in range(3):
+            self.comment(self.client, ip=f'10.0.0.{i}')
+        self.assertEqual(self.comment(self.client, ip='10.0.1.1')
+                         .status_code, 429)
+        other = Client()
+        other.force_login(self.other)
+        self.assertEqual(self.comment(other, ip='10.0.1.2').status_code, 302)
+        for _ in range(2):
+            self.comment(other, ip='10.0.2.1')
+        self.assertEqual(self.comment(other, ip='10.0.2.1').status_code, 429)
+        self.assertEqual(ratelimit.limited_counts()[('comment', 'user')], 2)
+
+    def test_login_and_signup(self):
+        """Вход и регистрация ограничены по IP, а GET форм — нет."""
+        guest = Client()
+        for name in ('users:login', 'users:signup'):
+            url = reverse(name)
+            with self.subTest(name=name):
+                statuses = [guest.post(url, {}).status_code
+                            for _ in range(3)]
+                self.assertEqual(statuses, [200, 200, 429])
+                self.assertEqual(guest.get(url).status_code, 200)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    }})
+    def test_stats_command(self):
+        """ratelimit_stats выводит число отклонённых запросов."""
+        cache.clear()
+        for _ in range(5):
+            self.comment(self.client)
+        out = StringIO()
+        call_command('ratelimit_stats', stdout=out)
+        self.assertIn('comment (ip): отклонено 2', out.getvalue())
+
+    def test_stats_command_needs_shared_cache(self):
+        """С LocMemCache команде не видны счётчики веб-процессов."""
+        with self.assertRaisesMessage(CommandError, 'LocMemCache'):
+            call_command('ratelimit_stats', stdout=StringIO())
+
+    def test_stats_view(self):
+        """Персонал видит отказы из кэша веб-процесса."""
+        for _ in range(5):
+            self.comment(self.client)
+        url = reverse('ratelimit_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        limited = self.client.get(url).json()['limited']
+        self.assertEqual(limited['comment'], {'ip': 2, 'user': 0})
@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import follow_graph, recommendations
+from ..models import Comment, Follow, Post, Suggestion, User
+
+
+class CSRTests(TestCase):
+    def test_rows(self):
+        """Строка матрицы — срез соседей, пропущенная строка пуста."""
+        matrix = recommendations.CSR([(1, 2), (1, 5), (4, 1), (7, 3)])
+        self.assertEqual(list(matrix.row(1)), [2, 5])
+        self.assertEqual(list(matrix.row(4)), [1])
+        self.assertEqual(list(matrix.row(7)), [3])
+        self.assertEqual(list(matrix.row(3)), [])
+        self.assertEqual(list(matrix.row(8)), [])
+        self.assertEqual(len(matrix), 4)
+        self.assertEqual(list(recommendations.CSR(()).row(1)), [])
+
+
+class RecommendationsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.friend = User.objects.create_user(username='friend')
+        cls.popular = User.objects.create_user(username='popular')
+        cls.niche = User.objects.create_user(username='niche')
+        cls.silent = User.objects.create_user(username='silent')
+        for author in (cls.friend, cls.popular, cls.niche):
+            Post.objects.create(author=author, text='Пост')
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.popular)
+        Follow.objects.create(user=cls.friend, author=cls.silent)
+        Follow.objects.create(user=cls.friend, author=cls.reader)
+        post = Post.objects.create(author=cls.friend, text='Обсуждение')
+        Comment.objects.create(post=post, author=cls.reader, text='Да')
+        Comment.objects.create(post=post, author=cls.niche, text='Нет')
+        Comment.objects.create(post=post, author=cls.friend, text='Ну')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def suggest(self, user):
+        return recommendations.suggest(
+            user.id, recommendations.load_follows(),
+            *recommendations.load_comments(),
+            recommendations.load_authors(), 20)
+
+    def test_suggest(self):
+        """Вес — за общие подписки и общие обсуждения; себя, прочитанных
+        и авторов без постов не предлагаем."""
+        self.assertEqual(self.suggest(self.reader), [
+            (recommendations.FOLLOW_WEIGHT, self.popular.id),
+            (recommendations.COMMENT_WEIGHT, self.niche.id),
+        ])
+
+    def test_command(self):
+        """recommend_authors сохраняет места и заменяет старые записи."""
+        Suggestion.objects.create(user=self.silent, author=self.friend,
+                                  rank=0, score=1)
+        out = StringIO()
+        call_command('recommend_authors', stdout=out)
+        call_command('recommend_authors', stdout=StringIO())
+        self.assertIn('пик памяти', out.getvalue())
+        self.assertEqual(list(Suggestion.objects.filter(
+            user=self.reader).values_list('rank', 'author_id')),
+            [(0, self.popular.id), (1, self.niche.id)])
+        self.assertFalse(Suggestion.objects.filter(user=self.silent).exists())
+
+    def test_command_clears_when_nothing_to_suggest(self):
+        """Без подписок и комментариев старые предложения удаляются."""
+        call_command('recommend_authors', stdout=StringIO())
+        self.assertTrue(Suggestion.objects.exists())
+        Follow.objects.all().delete()
+        Comment.objects.all().delete()
+        call_command('recommend_authors', stdout=StringIO())
+        self.assertFalse(Suggestion.objects.exists())
+
+    def test_suggested_authors(self):
+        """Блок читается одним запросом и пропускает новые подписки."""
+        call_command('recommend_authors', stdout=StringIO())
+        follow_graph.followees(self.reader.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                recommendations.suggested_authors(self.reader),
+                [self.popular, self.niche])
+        Follow.objects.create(user=self.reader, author=self.popular)
+        self.assertEqual(recommendations.suggested_authors(self.reader),
+                         [self.niche])
+        self.assertEqual(recommendations.suggested_authors(
+            self.reader, exclude=self.niche.id), [])
+
+    def test_pages(self):
+        """Предложения видны в ленте подписок и на странице автора."""
+        call_command('recommend_authors', stdout=StringIO())
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['suggestions'],
+                         [self.popular, self.niche])
+        self.assertContains(response, 'Кого почитать')
+        response = self.client.get(reverse(
+            'posts:profile', kwargs={'username': self.popular.username}))
+        self.assertEqual(response.context['suggestions'], [self.niche])
+
+    def test_synthetic(self):
+        """Замер на случайном графе ничего не пишет в базу."""
+        out = StringIO()
+        call_command('recommend_authors', synthetic=2000, users=100,
+                     stdout=out)
+        self.assertIn('пользователей: 100', out.getvalue())
+        self.assertFalse(Suggestion.objects.exists())
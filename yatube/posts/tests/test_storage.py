@@ -0,0 +1,304 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from .. import resize, thumbnails
+from ..management.commands.collect_media import Command, walk
+from ..models import Post, User
+from ..signals import forget_unused
+from ..storage import post_images
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+DIGEST = hashlib.sha256(SMALL_GIF).hexdigest()
+HASHED_NAME = f'posts/{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.gif'
+ORIENTATION = 0x0112
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, name):
+        return Post.objects.create(
+            author=self.author, text='Репост',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'))
+
+    def test_duplicates_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом по хэшу."""
+        first = self.create_post('first.gif')
+        second = self.create_post('SECOND.GIF')
+        self.assertEqual(first.image.name, HASHED_NAME)
+        self.assertEqual(second.image.name, HASHED_NAME)
+        self.assertEqual(os.listdir(os.path.dirname(first.image.path)),
+                         [f'{DIGEST}.gif'])
+
+    def test_duplicate_refreshes_mtime(self):
+        """Повторная загрузка обновляет время изменения файла, и
+        collect_media --min-age не примет его за старый мусор."""
+        first = self.create_post('first.gif')
+        os.utime(first.image.path, (0, 0))
+        self.create_post('second.gif')
+        self.assertGreater(os.stat(first.image.path).st_mtime, 0)
+
+    def test_thumbnails_once_per_image(self):
+        """Миниатюры дубликата не режутся заново и не удаляются, пока
+        картинку показывает другой пост."""
+        first = self.create_post('first.gif')
+        thumbnails.generate(first.image.name)
+        self.assertTrue(thumbnails.generated(HASHED_NAME))
+        second = self.create_post('second.gif')
+        # on_commit внутри TestCase не срабатывает — зовём напрямую.
+        second.delete()
+        forget_unused(HASHED_NAME)
+        self.assertTrue(thumbnails.generated(HASHED_NAME))
+        first.delete()
+        forget_unused(HASHED_NAME)
+        self.assertFalse(thumbnails.generated(HASHED_NAME))
+
+    def test_rehash_media(self):
+        """rehash_media переносит старые картинки под хэш и склеивает
+        дубликаты."""
+        legacy = []
+        for name in ('posts/a.gif', 'posts/b.gif'):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(SMALL_GIF)
+            legacy.append(path)
+        posts = [self.create_post('new.gif') for _ in range(3)]
+        Post.objects.filter(id=posts[0].id).update(image='posts/a.gif')
+        Post.objects.filter(id=posts[1].id).update(image='posts/b.gif')
+        Post.objects.filter(id=posts[2].id).update(image='posts/lost.gif')
+        out = StringIO()
+        call_command('rehash_media', dry_run=True, stdout=out)
+        self.assertIn('постов: 2', out.getvalue())
+        self.assertTrue(all(os.path.exists(path) for path in legacy))
+
+        call_command('rehash_media', stdout=out)
+        self.assertEqual(
+            list(Post.objects.filter(id__in=[posts[0].id, posts[1].id])
+                 .values_list('image', flat=True)),
+            [HASHED_NAME, HASHED_NAME])
+        self.assertFalse(any(os.path.exists(path) for path in legacy))
+        self.assertTrue(post_images.exists(HASHED_NAME))
+        self.assertTrue(thumbnails.generated(HASHED_NAME))
+        self.assertIn('уникальных: 1), постов: 2; нет файла: 1',
+                      out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        self.post = Post.objects.create(
+            author=self.author, text='Пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+        thumbnails.generate(self.post.image.name)
+        self.orphan = self.write('posts/orphan.gif')
+        self.stale = self.write('r/960x339/posts/00.gif')
+        # Ровесники: всё, кроме свежей загрузки, старше --min-age.
+        for root, _, files in os.walk(TEMP_MEDIA_ROOT):
+            for file in files:
+                os.utime(os.path.join(root, file), (0, 0))
+        self.young = self.write('posts/young.gif')
+
+    def write(self, name):
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(SMALL_GIF)
+        return path
+
+    def test_walk_order(self):
+        """walk() отдаёт файлы по порядку имён и продолжает с любого."""
+        self.write('posts/ab.gif')
+        self.write('posts/ab/cd/ef.gif')
+        names = [name for name, _ in walk(TEMP_MEDIA_ROOT, 'posts')]
+        self.assertEqual(names, sorted(names))
+        self.assertIn('posts/ab/cd/ef.gif', names)
+        for i, name in enumerate(names):
+            self.assertEqual(
+                [name for name, _ in walk(TEMP_MEDIA_ROOT, 'posts', name)],
+                names[i + 1:])
+
+    def test_dry_run(self):
+        """В пробном запуске мусор только считается."""
+        out = StringIO()
+        call_command('collect_media', dry_run=True, stdout=out)
+        self.assertIn('originals: просмотрено 3, найдено 1', out.getvalue())
+        self.assertIn('thumbnails: просмотрено 2, найдено 1', out.getvalue())
+        self.assertTrue(os.path.exists(self.orphan))
+        self.assertTrue(os.path.exists(self.stale))
+
+    def test_quarantine(self):
+        """Мусор переносится в карантин, нужное и свежее остаётся."""
+        quarantine = os.path.join(TEMP_MEDIA_ROOT, 'quarantine')
+        checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'checkpoint.json')
+        call_command('collect_media', quarantine=quarantine,
+                     checkpoint=checkpoint, chunk_size=1, stdout=StringIO())
+        self.assertFalse(os.path.exists(self.orphan))
+        self.assertFalse(os.path.exists(self.stale))
+        self.assertTrue(os.path.exists(
+            os.path.join(quarantine, 'originals', 'posts', 'orphan.gif')))
+        self.assertTrue(os.path.exists(
+            os.path.join(quarantine, 'thumbnails', 'r/960x339/posts/00.gif')))
+        self.assertTrue(os.path.exists(self.young))
+        self.assertTrue(os.path.exists(self.post.image.path))
+        self.assertTrue(thumbnails.generated(self.post.image.name))
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_quarantine_keeps_thumbnails(self):
+        """Миниатюры убранной картинки тоже уходят в карантин, а не
+        удаляются: карантин можно вернуть целиком."""
+        quarantine = os.path.join(TEMP_MEDIA_ROOT, 'quarantine')
+        thumbnails.generate('posts/orphan.gif')
+        copies = [resize.resized_name('posts/orphan.gif', *size)
+                  for size in resize.sizes()]
+        call_command('collect_media', quarantine=quarantine,
+                     stdout=StringIO())
+        self.assertFalse(thumbnails.generated('posts/orphan.gif'))
+        for copy in copies:
+            self.assertTrue(os.path.exists(
+                os.path.join(quarantine, 'thumbnails', copy)))
+
+    def test_recheck_before_remove(self):
+        """Файл, который занял пост после сверки куска, не удаляется."""
+        unused_originals = Command.unused_originals
+
+        def reuse_after_check(command, names):
+            unused = unused_originals(command, names)
+            if not Post.objects.filter(image='posts/orphan.gif').exists():
+                Post.objects.create(author=self.author, text='Повтор',
+                                    image='posts/orphan.gif')
+            return unused
+
+        with mock.patch.object(Command, 'unused_originals',
+                               reuse_after_check):
+            call_command('collect_media', stdout=StringIO())
+        self.assertTrue(os.path.exists(self.orphan))
+        self.assertFalse(os.path.exists(self.stale))
+
+    def test_resume_from_checkpoint(self):
+        """Прерванный обход продолжается с запомненного имени."""
+        checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'checkpoint.json')
+        with open(checkpoint, 'w') as file:
+            json.dump({'originals': 'posts/orphan.gif',
+                       'thumbnails': 'r/960x339/posts/00.gif'}, file)
+        out = StringIO()
+        call_command('collect_media', checkpoint=checkpoint, stdout=out)
+        self.assertIn('originals: просмотрено 1, убрано 0', out.getvalue())
+        self.assertTrue(os.path.exists(self.orphan))
+        self.assertTrue(os.path.exists(self.stale))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ReencodeMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, name, content):
+        return Post.objects.create(
+            author=self.author, text='Пост',
+            image=SimpleUploadedFile(name, content))
+
+    def heavy_jpeg(self):
+        """JPEG наибольшего качества с EXIF-поворотом на 90°."""
+        image = Image.effect_noise((300, 200), 40).convert('RGB')
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=100, exif=exif)
+        return buffer.getvalue()
+
+    def test_reencode(self):
+        """Тяжёлый JPEG пережимается без метаданных, пост и миниатюры
+        переезжают на новое имя; GIF не трогается."""
+        post = self.create_post('photo.jpg', self.heavy_jpeg())
+        gif = self.create_post('small.gif', SMALL_GIF)
+        old_name, old_size = post.image.name, post.image_size
+        thumbnails.generate(old_name)
+        out = StringIO()
+        call_command('reencode_media', workers=1, stdout=out)
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertTrue(post_images.is_hashed(post.image.name))
+        self.assertLess(post.image_size, old_size)
+        self.assertEqual(post.image_size, post.image.size)
+        self.assertEqual((post.image_width, post.image_height), (200, 300))
+        with Image.open(post.image.path) as image:
+            self.assertNotIn('exif', image.info)
+            self.assertTrue(image.info.get('progressive'))
+        self.assertFalse(post_images.exists(old_name))
+        self.assertFalse(thumbnails.generated(old_name))
+        self.assertTrue(thumbnails.generated(post.image.name))
+        self.assertEqual(Post.objects.get(id=gif.id).image.name,
+                         gif.image.name)
+        self.assertIn('Заменено картинок: 1', out.getvalue())
+
+        out = StringIO()
+        call_command('reencode_media', workers=1, stdout=out)
+        self.assertIn('Заменено картинок: 0', out.getvalue())
+
+    def test_reencode_keeps_shard_depth(self):
+        """Повторное пережатие не вкладывает шарды друг в друга."""
+        post = self.create_post('photo.jpg', self.heavy_jpeg())
+        for _ in range(2):
+            # Отрицательная экономия: файл заменяется при каждом запуске.
+            call_command('reencode_media', workers=1, min_saving=-1,
+                         stdout=StringIO())
+            post.refresh_from_db()
+            self.assertRegex(post.image.name,
+                             r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[^/]+$')
+            self.assertTrue(post_images.exists(post.image.name))
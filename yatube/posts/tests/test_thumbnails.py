@@ -0,0 +1,214 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import resize, thumbnails
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def small_png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (2, 1), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=ThumbnailPipelineTests.author,
+            text='Тестовый пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        thumbnails.forget(self.post.image.name)
+
+    def test_generate_all_sizes(self):
+        """generate() нарезает все размеры, post_thumbnail() ведёт на них
+        без обращения к файлам."""
+        self.assertFalse(thumbnails.generated(self.post.image.name))
+        thumbnails.generate(self.post.image.name)
+        self.assertTrue(thumbnails.generated(self.post.image.name))
+        width, height = settings.POST_THUMBNAILS['post']
+        with open(resize.resized_path(self.post.image.name, width,
+                                      height), 'rb') as file:
+            self.assertEqual(Image.open(file).size, (width, height))
+        with mock.patch('os.path.exists') as exists:
+            picture = thumbnails.post_thumbnail(self.post)
+        exists.assert_not_called()
+        self.assertEqual(picture, (
+            f'/media/r/{width}x{height}/{self.post.image.name}',
+            width, height))
+
+    def test_small_image_inline(self):
+        """Маленькая картинка режется сразу, без пула."""
+        self.assertIsNone(thumbnails.schedule(self.post.image.name,
+                                              pixels=2))
+        self.assertFalse(thumbnails.is_pending(self.post.image.name))
+        self.assertTrue(thumbnails.generated(self.post.image.name))
+
+    def test_broken_image(self):
+        """Отсутствующий файл не роняет нарезку и страницу."""
+        post = Post.objects.create(author=self.author, text='Без файла',
+                                   image='posts/missing.jpg')
+        thumbnails.generate(post.image.name)
+        self.assertFalse(thumbnails.generated(post.image.name))
+        self.assertIsNone(thumbnails.post_thumbnail(Post(text='Без картинки')))
+
+    def test_forget(self):
+        """forget() удаляет миниатюры старой картинки."""
+        thumbnails.generate(self.post.image.name)
+        thumbnails.forget(self.post.image.name)
+        self.assertFalse(thumbnails.generated(self.post.image.name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ResizedImageViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост',
+            image=SimpleUploadedFile('red.png', small_png('red'),
+                                     'image/png'))
+        cls.width, cls.height = settings.POST_THUMBNAILS['post']
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        thumbnails.forget(self.post.image.name)
+
+    def url(self, width=None, height=None, name=None):
+        return reverse('posts:resized_image', kwargs={
+            'width': width or self.width,
+            'height': height or self.height,
+            'name': name or self.post.image.name,
+        })
+
+    def test_resize_on_demand(self):
+        """Первый запрос режет копию на диск, дальше отдаётся она же
+        с ETag и годовым Cache-Control."""
+        url = self.url()
+        self.assertEqual(url, thumbnails.post_thumbnail(self.post).url)
+        response = Client().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        body = b''.join(response.streaming_content)
+        self.assertEqual(Image.open(io.BytesIO(body)).size,
+                         (self.width, self.height))
+        self.assertTrue(thumbnails.generated(self.post.image.name))
+        with mock.patch.object(resize, '_resize') as resize_mock:
+            again = Client().get(url)
+            not_modified = Client().get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        resize_mock.assert_not_called()
+        self.assertEqual(b''.join(again.streaming_content), body)
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_exif_orientation(self):
+        """Копия повёрнута по EXIF, как снимок показывает браузер."""
+        # Верх кадра светлый, низ тёмный; поворот 6 — на 90° по часовой,
+        # после него тёмная половина слева.
+        image = Image.new('L', (40, 20), 255)
+        image.paste(0, (0, 10, 40, 20))
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        source = io.BytesIO()
+        image.convert('RGB').save(source, 'JPEG', exif=exif)
+        source.seek(0)
+        target = io.BytesIO()
+        resize._resize(source, target, 20, 20)
+        target.seek(0)
+        with Image.open(target) as result:
+            result = result.convert('L')
+            self.assertLess(result.getpixel((2, 3)), 64)
+            self.assertGreater(result.getpixel((17, 3)), 192)
+
+    def test_rejected(self):
+        """Неразрешённые размеры, чужие пути и пропавшие файлы — 404."""
+        for url in (self.url(width=100, height=100),
+                    self.url(name='users/secret.png'),
+                    self.url(name='posts/../../settings.py'),
+                    self.url(name='posts/missing.png')):
+            with self.subTest(url=url):
+                self.assertEqual(Client().get(url).status_code, 404)
+        self.assertFalse(os.path.exists(
+            os.path.join(TEMP_MEDIA_ROOT, resize.PREFIX, '100x100')))
+
+    def test_concurrent_requests_resize_once(self):
+        """Одновременные запросы одной копии режут её один раз."""
+        calls = []
+        original = resize._resize
+
+        def slow_resize(*args):
+            calls.append(args)
+            original(*args)
+
+        start = threading.Barrier(4)
+
+        def render():
+            start.wait()
+            resize.render(self.post.image.name, self.width, self.height)
+
+        with mock.patch.object(resize, '_resize', slow_resize):
+            workers = [threading.Thread(target=render) for _ in range(4)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(len(calls), 1)
+        directory = os.path.dirname(resize.resized_path(
+            self.post.image.name, self.width, self.height))
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_webp_variant(self):
+        """Вариант в WebP отдаётся только браузерам, которые его берут."""
+        path = resize.render(self.post.image.name, self.width, self.height)
+        with open(resize.webp_path(path), 'wb') as file:
+            file.write(b'RIFF-webp')
+        plain = Client().get(self.url(), HTTP_ACCEPT='image/png,*/*')
+        webp = Client().get(self.url(), HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(plain['Content-Type'], 'image/png')
+        self.assertEqual(webp['Content-Type'], 'image/webp')
+        self.assertEqual(b''.join(webp.streaming_content), b'RIFF-webp')
+        self.assertNotEqual(plain['ETag'], webp['ETag'])
+        self.assertIn('Accept', webp['Vary'])
+        thumbnails.forget(self.post.image.name)
+        self.assertFalse(os.path.exists(resize.webp_path(path)))
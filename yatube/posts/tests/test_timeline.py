@@ -0,0 +1,92 @@
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import follow_graph
+from ..models import Follow, Post, TimelineEntry, User
+
+
+class FollowTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+
+    def setUp(self):
+        cache.clear()
+        self.follower_client = Client()
+        self.follower_client.force_login(FollowTimelineTests.follower)
+
+    def timeline_posts(self):
+        return list(TimelineEntry.objects.filter(
+            user=self.follower).order_by('-pub_date', '-post_id').values_list(
+            'post_id', flat=True))
+
+    def test_backfill_and_fan_out(self):
+        """Подписка заполняет ленту, новый пост попадает в неё сразу."""
+        old = Post.objects.create(text='Старый пост', author=self.author)
+        self.follower_client.get(reverse('posts:profile_follow',
+                                 kwargs={'username': self.author.username}))
+        self.assertEqual(self.timeline_posts(), [old.id])
+        new = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self.timeline_posts(), [new.id, old.id])
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [new, old])
+
+    def test_fan_out_ignores_stale_graph(self):
+        """Пост попадает в ленту, даже если граф в кэше не знает
+        о подписчике."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        cache.set(follow_graph.FOLLOWERS_KEY.format(self.author.id), b'')
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self.timeline_posts(), [post.id])
+
+    def test_unfollow_prunes(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.create(text='Пост', author=self.author)
+        self.follower_client.get(reverse('posts:profile_unfollow',
+                                 kwargs={'username': self.author.username}))
+        self.assertEqual(self.timeline_posts(), [])
+
+    @override_settings(FOLLOW_TIMELINE_LENGTH=3)
+    def test_timeline_is_capped(self):
+        """Новый пост ленты не пересчитывает, а trim_timelines обрезает
+        их до FOLLOW_TIMELINE_LENGTH свежих постов."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(4)]
+        with CaptureQueriesContext(connection) as queries:
+            posts.append(Post.objects.create(text='Пост 4',
+                                             author=self.author))
+        self.assertFalse([query for query in queries
+                          if 'COUNT(' in query['sql']])
+        self.assertEqual(len(self.timeline_posts()), 5)
+        out = StringIO()
+        call_command('trim_timelines', batch_size=1, stdout=out)
+        self.assertIn('Обрезано лент: 1', out.getvalue())
+        self.assertEqual(self.timeline_posts(),
+                         [post.id for post in reversed(posts[-3:])])
+
+    @override_settings(FOLLOW_TIMELINE_LENGTH=3)
+    def test_backfill_migration(self):
+        """Миграция заполняет ленты подписок, созданных до лент."""
+        migration = import_module('posts.migrations.0019_backfill_timelines')
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(5)]
+        # bulk_create не шлёт сигналов: подписка как до миграции 0011.
+        Follow.objects.bulk_create(
+            [Follow(user=self.follower, author=self.author)])
+        self.assertEqual(self.timeline_posts(), [])
+        migration.backfill_timelines(apps, None)
+        migration.backfill_timelines(apps, None)
+        self.assertEqual(self.timeline_posts(),
+                         [post.id for post in reversed(posts[-3:])])
@@ -1,8 +1,9 @@
 from http import HTTPStatus
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from ..models import Group, Post, User, Comment, Follow
@@ -41,6 +42,7 @@ class ViewsURLTests(TestCase):
                                  group=cls.group_2) for i in range(2)])
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.author_client = Client()
         self.not_author_client = Client()
@@ -308,3 +310,160 @@ class ViewsURLTests(TestCase):
 
         response2 = not_author_client_2.get(reverse('posts:follow_index'))
         self.assertEqual(len(response2.context['page_obj']), 0)
+
+
+@override_settings(COMMENTS_PAGE=3)
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for i in range(7):
+            Comment.objects.create(post=cls.post, author=cls.author,
+                                   text=f'Комментарий {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:post_comments',
+                           kwargs={'post_id': self.post.id})
+
+    def test_first_page_rendered(self):
+        """На странице поста только первые COMMENTS_PAGE комментариев
+        и курсор следующих."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertEqual([comment.text for comment in
+                          response.context['comments']],
+                         ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'])
+        self.assertContains(response, 'js-more-comments')
+        self.assertIsNotNone(response.context['comments_next'])
+
+    def test_cursor_continues(self):
+        """Курсор отдаёт следующие порции без повторов и пропусков."""
+        texts = []
+        cursor = ''
+        for _ in range(3):
+            response = self.client.get(
+                reverse('posts:post_detail',
+                        kwargs={'post_id': self.post.id}),
+                {'comments': cursor})
+            texts += [comment.text for comment in response.context['comments']]
+            cursor = response.context['comments_next']
+        self.assertEqual(texts, [f'Комментарий {i}' for i in range(7)])
+        self.assertIsNone(cursor)
+
+    def test_fragment(self):
+        """Без format=json подгружается HTML-фрагмент."""
+        first = self.client.get(self.url)
+        self.assertTemplateUsed(first, 'posts/includes/comments.html')
+        response = self.client.get(
+            self.url, {'cursor': first.context['comments_next']})
+        self.assertContains(response, 'Комментарий 3')
+        self.assertNotContains(response, 'Комментарий 2')
+        self.assertEqual(response['Surrogate-Key'], f'post:{self.post.id}')
+
+    def test_json(self):
+        """format=json отдаёт комментарии и курсор следующей порции."""
+        data = self.client.get(self.url, {'format': 'json'}).json()
+        self.assertEqual([comment['text'] for comment in data['comments']],
+                         ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'])
+        self.assertEqual(data['comments'][0]['author'], 'author')
+        last = self.client.get(self.url, {'format': 'json',
+                                          'cursor': data['next']}).json()
+        self.assertEqual(last['comments'][0]['text'], 'Комментарий 3')
+
+    def test_missing_post(self):
+        """Комментарии несуществующего поста — 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 10 ** 6}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(COMMENTS_PAGE=2)
+class CommentThreadsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.other_post = Post.objects.create(author=cls.author, text='Другой')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def comment(self, text, parent=None, post=None):
+        return Comment.objects.create(post=post or self.post,
+                                      author=self.author, text=text,
+                                      parent=parent)
+
+    def test_thread_order(self):
+        """Ответы идут за родителем по порядку создания, поддерево
+        читается одним запросом."""
+        first = self.comment('1')
+        second = self.comment('2')
+        reply = self.comment('1.1', first)
+        self.comment('2.1', second)
+        self.comment('1.1.1', reply)
+        self.comment('1.2', first)
+        self.assertEqual(
+            [c.text for c in Comment.objects.filter(post=self.post)
+             .order_by('path')],
+            ['1', '1.1', '1.1.1', '1.2', '2', '2.1'])
+        with self.assertNumQueries(1):
+            subtree = [(c.text, c.depth)
+                       for c in Comment.objects.subtree(reply)]
+        self.assertEqual(subtree, [('1.1', 1), ('1.1.1', 2)])
+
+    def test_paginate_by_thread(self):
+        """Страница — COMMENTS_PAGE веток верхнего уровня целиком."""
+        for i in range(3):
+            root = self.comment(f'{i}')
+            self.comment(f'{i}.1', root)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertEqual([c.text for c in response.context['comments']],
+                         ['0', '0.1', '1', '1.1'])
+        data = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'format': 'json', 'cursor': response.context['comments_next']}
+        ).json()
+        self.assertEqual([(c['text'], c['depth']) for c in data['comments']],
+                         [('2', 0), ('2.1', 1)])
+        self.assertIsNone(data['next'])
+
+    def test_reply(self):
+        """Ответ через форму встаёт в ветку; ответ на комментарий
+        чужого поста не сохраняется."""
+        page = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            {'reply': 7})
+        self.assertContains(page, 'name="parent" value="7"')
+        root = self.comment('Корень')
+        foreign = self.comment('Чужой', post=self.other_post)
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.id})
+        self.client.post(url, {'text': 'Ответ', 'parent': root.id})
+        response = self.client.post(url, {'text': 'Мимо',
+                                          'parent': foreign.id})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual(reply.parent, root)
+        self.assertTrue(reply.path.startswith(root.path))
+        self.assertFalse(Comment.objects.filter(text='Мимо').exists())
+
+    def test_max_depth(self):
+        """Глубже MAX_DEPTH ответ встаёт рядом с родителем."""
+        parent = None
+        for i in range(Comment.MAX_DEPTH + 1):
+            parent = self.comment(f'{i}', parent)
+        self.assertEqual(parent.depth, Comment.MAX_DEPTH - 1)
+
+    def test_delete_thread(self):
+        """Удаление комментария убирает ответы и уменьшает счётчик."""
+        root = self.comment('Корень')
+        self.comment('Ответ', self.comment('Ответ', root))
+        root.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        self.assertFalse(Comment.objects.exists())
@@ -0,0 +1,110 @@
+"""Нарезка миниатюр картинок постов сразу после загрузки.
+
+Миниатюры отдаёт /media/r/<w>x<h>/<имя> (posts.resize), нарезая их при
+первом запросе. Чтобы первый читатель нового поста не ждал
+декодирования и ресайза, все размеры из settings.POST_THUMBNAILS
+заранее режутся в фоновом пуле потоков. Адрес миниатюры от этого не
+зависит: запрос, пришедший раньше пула, дождётся его на блокировке
+ключа или нарежет сам. Очередь ограничена: если она заполнена,
+миниатюру нарежет первый запрос.
+"""
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import resize
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'posts:thumbnail_pending:{}'
+
+Picture = namedtuple('Picture', 'url width height')
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def _pending_key(name):
+    return PENDING_KEY.format(name)
+
+
+def generate(name):
+    """Нарезает все миниатюры картинки name."""
+    try:
+        for width, height in resize.sizes():
+            resize.render(name, width, height)
+    except Exception:
+        logger.exception('Не удалось нарезать миниатюры %s', name)
+    finally:
+        cache.delete(_pending_key(name))
+
+
+def _work(name):
+    try:
+        generate(name)
+    finally:
+        _slots.release()
+
+
+def _get_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            _slots = threading.BoundedSemaphore(
+                settings.THUMBNAIL_QUEUE_LENGTH)
+            _pool = ThreadPoolExecutor(settings.THUMBNAIL_WORKERS,
+                                       thread_name_prefix='thumbnails')
+    return _pool
+
+
+def schedule(name, pixels=None):
+    """Ставит нарезку миниатюр name в очередь.
+
+    Возвращает Future задачи или None, если миниатюры уже нарезаны
+    (THUMBNAIL_WORKERS = 0 или в картинке не больше
+    THUMBNAIL_INLINE_PIXELS пикселей), ту же картинку уже режет другая
+    задача или очередь заполнена.
+    """
+    if (not settings.THUMBNAIL_WORKERS or pixels is not None
+            and pixels <= settings.THUMBNAIL_INLINE_PIXELS):
+        generate(name)
+        return None
+    if is_pending(name):
+        return None
+    pool = _get_pool()
+    if not _slots.acquire(blocking=False):
+        logger.warning('Очередь миниатюр заполнена, %s пропущена', name)
+        return None
+    cache.set(_pending_key(name), True, settings.THUMBNAIL_PENDING_TIMEOUT)
+    return pool.submit(_work, name)
+
+
+def generated(name):
+    """Нарезаны ли уже все миниатюры картинки name."""
+    return resize.exists(name)
+
+
+def is_pending(name):
+    return cache.get(_pending_key(name)) is not None
+
+
+def post_thumbnail(post, kind='post'):
+    """Миниатюра kind картинки поста: адрес и размеры без обращения
+    к файлам — картинка вписывается в рамку с обрезкой по центру."""
+    if not post.image:
+        return None
+    width, height = settings.POST_THUMBNAILS[kind]
+    return Picture(resize.url(post.image.name, width, height), width, height)
+
+
+def forget(name):
+    """Удаляет миниатюры картинки name."""
+    try:
+        resize.delete(name)
+    except Exception:
+        logger.exception('Не удалось удалить миниатюры %s', name)
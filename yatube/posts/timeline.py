@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Follow, Post, TimelineEntry
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Подписчики читаются из базы, а не из графа в кэше: пропущенную
+    из-за устаревшего графа запись потом ничто не восстановит.
+
+    Ленты здесь не обрезаются: пересчитывать ленту каждого подписчика
+    на каждый пост слишком дорого. Лишние записи убирает команда
+    trim_timelines, а до неё лента длиннее FOLLOW_TIMELINE_LENGTH на
+    посты, пришедшие с её прошлого запуска.
+    """
+    follower_ids = list(Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create([
+        TimelineEntry(user_id=user_id, post_id=post.id,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in follower_ids
+    ], ignore_conflicts=True)
+
+
+def backfill(user_id, author_ids):
+    """Добавляет в ленту подписчика последние посты новых авторов.
+
+    Лента хранит FOLLOW_TIMELINE_LENGTH свежих постов, поэтому
+    всех авторов сразу хватает одного запроса с тем же лимитом.
+    """
+    posts = Post.objects.filter(author_id__in=author_ids).order_by(
+        '-pub_date', '-id').values_list('id', 'author_id', 'pub_date')
+    TimelineEntry.objects.bulk_create([
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for post_id, author_id, pub_date
+        in posts[:settings.FOLLOW_TIMELINE_LENGTH]
+    ], ignore_conflicts=True)
+    trim([user_id])
+
+
+def prune(user_id, author_ids):
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id__in=author_ids).delete()
+
+
+def trim(user_ids):
+    """Обрезает переполненные ленты до FOLLOW_TIMELINE_LENGTH записей.
+
+    Возвращает число обрезанных лент.
+    """
+    limit = settings.FOLLOW_TIMELINE_LENGTH
+    overflowing = TimelineEntry.objects.filter(
+        user_id__in=user_ids
+    ).order_by().values('user_id').annotate(
+        entries=Count('id')
+    ).filter(entries__gt=limit).values_list('user_id', flat=True)
+    overflowing = list(overflowing)
+    for user_id in overflowing:
+        timeline = TimelineEntry.objects.filter(user_id=user_id)
+        pub_date, post_id = timeline.order_by(
+            '-pub_date', '-post_id'
+        ).values_list('pub_date', 'post_id')[limit - 1]
+        timeline.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, post_id__lt=post_id)
+        ).delete()
+    return len(overflowing)
@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import resize, views
 
 app_name = 'posts'
 urlpatterns = [
@@ -12,9 +13,18 @@ urlpatterns = [
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments, name='post_comments'),
     path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/follow/',
          views.profile_follow, name='profile_follow'),
     path('profile/<str:username>/unfollow/',
          views.profile_unfollow, name='profile_unfollow'),
+    path('follow/bulk/', views.bulk_follow, name='bulk_follow'),
+    path('unfollow/bulk/', views.bulk_unfollow, name='bulk_unfollow'),
+    path('staff/follow-graph/', views.follow_graph_check,
+         name='follow_graph_check'),
+    path(f'{settings.MEDIA_URL.lstrip("/")}{resize.PREFIX}/'
+         '<int:width>x<int:height>/<path:name>',
+         views.resized_image, name='resized_image'),
 ]
@@ -0,0 +1,59 @@
+from collections import namedtuple
+
+from django.conf import settings
+
+from .models import Comment
+from .paginator import CursorPaginator, WindowPaginator
+
+CommentsPage = namedtuple('CommentsPage', 'comments next_cursor')
+
+
+def get_page_obj(request, posts, fields=('pub_date', 'id'), count=None):
+    """Страница ленты: по ?page= — номерная без COUNT, иначе по ?cursor=.
+
+    fields — поля ключа (дата, id), по которым упорядочена лента;
+    count — известное из счётчиков число записей, если оно есть.
+    """
+    if 'page' in request.GET:
+        ordering = [f'-{field}' for field in fields]
+        paginator = WindowPaginator(posts.order_by(*ordering),
+                                    settings.POST_PAGE, count=count)
+        return paginator.get_page(request.GET.get('page'))
+    paginator = CursorPaginator(posts, settings.POST_PAGE, fields=fields)
+    return paginator.get_cursor_page(request.GET.get('cursor'))
+
+
+def get_comments_page(post_id, cursor=None):
+    """Ветки комментариев поста: COMMENTS_PAGE веток верхнего уровня
+    целиком, начиная с cursor, и курсор следующей порции (None, если
+    её нет).
+
+    Курсор — путь корня первой ветки порции. Корни находятся по индексу
+    (post, parent, path), а ветки со всеми ответами читаются одним
+    диапазоном путей от первого корня порции до первого корня следующей.
+    """
+    roots = Comment.objects.filter(post_id=post_id, parent=None)
+    if (cursor and cursor.isdigit()
+            and len(cursor) == Comment.PATH_STEP):
+        roots = roots.filter(path__gte=cursor)
+    paths = list(roots.order_by('path').values_list('path', flat=True)
+                 [:settings.COMMENTS_PAGE + 1])
+    if not paths:
+        return CommentsPage([], None)
+    comments = Comment.objects.filter(
+        post_id=post_id, path__gte=paths[0]).select_related('author')
+    next_cursor = None
+    if len(paths) > settings.COMMENTS_PAGE:
+        next_cursor = paths[-1]
+        comments = comments.filter(path__lt=next_cursor)
+    return CommentsPage(list(comments.order_by('path')), next_cursor)
+
+
+def surrogate_keys(posts):
+    """Суррогатные ключи страницы с этими постами (см. core.page_cache)."""
+    keys = set()
+    for post in posts:
+        keys.update((f'post:{post.id}', f'author:{post.author_id}'))
+        if post.group_id:
+            keys.add(f'group:{post.group_id}')
+    return keys
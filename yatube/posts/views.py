@@ -1,91 +1,152 @@
+import mimetypes
+import os
+import posixpath
+import re
+
 from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.core.paginator import Paginator
+from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import (condition, require_http_methods,
+                                          require_POST)
 
+from core.page_cache import add_surrogate_keys
+from core.ratelimit import ratelimit
 
+from . import (conditional, feeds, follow_graph, follows, recommendations,
+               resize)
+from .feed_cache import feed_cache_context
 from .forms import PostForm, CommentForm
-from .models import Follow, Group, Post, Comment
+from .models import AuthorStats, Counter, Follow, Group, Post
+from .utils import get_comments_page, get_page_obj, surrogate_keys
 
 
+@condition(etag_func=conditional.index_etag)
 def index(request):
-    posts = Post.objects.all()
-    count = posts.count()
-    paginator = Paginator(posts, settings.POST_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.select_related('author', 'group')
+    count = Counter.objects.get_value(Counter.POSTS, Post.objects.count)
+    page_obj = get_page_obj(request, posts, count=count)
     context = {
         'page_obj': page_obj,
         'count': count,
+        **feed_cache_context(request, page_obj, 'index'),
     }
-    return render(request, 'posts/index.html', context)
+    response = render(request, 'posts/index.html', context)
+    return add_surrogate_keys(response,
+                              {'feed:index', *surrogate_keys(page_obj)})
 
 
+@condition(etag_func=conditional.group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group)
-    count = posts.count()
+    posts = group.posts.select_related('author', 'group')
+    count = group.post_count
     text = 'Записи сообщества'
-    paginator = Paginator(posts, settings.POST_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_page_obj(request, posts, count=count)
     context = {
         'group': group,
         'page_obj': page_obj,
         'text': text,
         'count': count,
+        **feed_cache_context(request, page_obj, 'group', group.id),
     }
-    return render(request, 'posts/group_list.html', context)
+    response = render(request, 'posts/group_list.html', context)
+    return add_surrogate_keys(
+        response, {f'group:{group.id}', *surrogate_keys(page_obj)})
 
 
+@condition(etag_func=conditional.profile_etag)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    count = posts.count()
-    paginator = Paginator(posts, settings.POST_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    following = Follow.objects.filter(user__username=request.user,
-                                      author=author)
+    count = AuthorStats.objects.post_count(author.id)
+    page_obj = feeds.author_page(request, author, count)
+    following = follow_graph.reader_follows(request, author.id)
     context = {
         'author': author,
         'page_obj': page_obj,
         'count': count,
-        'following': following
+        'following': following,
+        'suggestions': recommendations.suggested_authors(
+            request.user, exclude=author.id),
+        **feed_cache_context(request, page_obj, 'profile', author.id),
     }
-    return render(request, 'posts/profile.html', context)
+    response = render(request, 'posts/profile.html', context)
+    return add_surrogate_keys(
+        response, {f'author:{author.id}', *surrogate_keys(page_obj)})
 
 
+@condition(etag_func=conditional.post_detail_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = Comment.objects.select_related("author").filter(post=post)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
+    comments = get_comments_page(post.id, request.GET.get('comments'))
     author = post.author.get_full_name
-    count = post.author.posts.count()
+    count = AuthorStats.objects.post_count(post.author_id)
     form = CommentForm(request.POST or None)
+    reply = request.GET.get('reply', '')
     context = {
         'post': post,
         'author': author,
         'count': count,
         'form': form,
-        'comments': comments,
+        'reply': reply if reply.isdigit() else None,
+        'comments': comments.comments,
+        'comments_next': comments.next_cursor,
     }
-    return render(request, 'posts/post_detail.html', context)
+    response = render(request, 'posts/post_detail.html', context)
+    return add_surrogate_keys(response, surrogate_keys([post]))
+
 
+def post_comments(request, post_id):
+    """Следующая порция веток комментариев: HTML-фрагмент или JSON
+    (?format=json)."""
+    cursor = request.GET.get('cursor')
+    page = get_comments_page(post_id, cursor)
+    if not page.comments and not cursor:
+        get_object_or_404(Post.objects.only('id'), pk=post_id)
+    if request.GET.get('format') == 'json':
+        response = JsonResponse({
+            'comments': [{
+                'id': comment.id,
+                'parent': comment.parent_id,
+                'depth': comment.depth,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created,
+            } for comment in page.comments],
+            'next': page.next_cursor,
+        })
+    else:
+        response = render(request, 'posts/includes/comments.html', {
+            'post_id': post_id,
+            'comments': page.comments,
+            'comments_next': page.next_cursor,
+        })
+    return add_surrogate_keys(response, {f'post:{post_id}'})
 
+
+@ratelimit('comment')
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
+    parent_id = request.POST.get('parent', '')
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        if parent_id.isdigit():
+            # Отвечать можно только на комментарии того же поста.
+            comment.parent = get_object_or_404(post.comments, pk=parent_id)
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@ratelimit('post')
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None,
@@ -121,14 +182,13 @@ def post_edit(request, post_id):
 
 
 @login_required
+@condition(etag_func=conditional.follow_etag)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, settings.POST_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = feeds.follow_page(request, request.user)
     context = {
         "page_obj": page_obj,
-        "follow": True
+        "follow": True,
+        "suggestions": recommendations.suggested_authors(request.user),
     }
     return render(request, "posts/follow.html", context)
 
@@ -136,9 +196,12 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
+    response = redirect(reverse('posts:profile',
+                                kwargs={'username': username}))
     if author != request.user:
         Follow.objects.get_or_create(user=request.user, author=author)
-    return redirect(reverse('posts:profile', kwargs={'username': username}))
+        follow_graph.mark_changed(response)
+    return response
 
 
 @login_required
@@ -146,4 +209,74 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     follow = request.user.follower.filter(author=author)
     follow.delete()
-    return redirect(reverse('posts:profile', kwargs={'username': username}))
+    response = redirect(reverse('posts:profile',
+                                kwargs={'username': username}))
+    follow_graph.mark_changed(response)
+    return response
+
+
+def _bulk_follow(request, action, changed_key):
+    usernames = request.POST.getlist('username') + re.split(
+        r'[\s,]+', request.POST.get('usernames', '').strip())
+    usernames = [username for username in usernames if username]
+    if len(usernames) > settings.BULK_FOLLOW_LIMIT:
+        return JsonResponse(
+            {'error': f'Не больше {settings.BULK_FOLLOW_LIMIT} авторов '
+                      'за запрос'}, status=400)
+    result = action(request.user, usernames)
+    response = JsonResponse({changed_key: result.changed,
+                             'missing': result.missing})
+    if result.changed:
+        follow_graph.mark_changed(response)
+    return response
+
+
+@ratelimit('follow')
+@login_required
+@require_POST
+def bulk_follow(request):
+    """Подписка на авторов из полей username или списка usernames
+    через пробел или запятую."""
+    return _bulk_follow(request, follows.follow_many, 'followed')
+
+
+@ratelimit('follow')
+@login_required
+@require_POST
+def bulk_unfollow(request):
+    return _bulk_follow(request, follows.unfollow_many, 'unfollowed')
+
+
+@staff_member_required
+@require_http_methods(['GET', 'POST'])
+def follow_graph_check(request):
+    """Сверка графа подписок в кэше этого процесса; POST чинит его.
+
+    С LocMemCache команда check_follow_graph не видит кэш воркеров,
+    поэтому сверка запускается здесь.
+    """
+    fix = request.method == 'POST'
+    followees, followers = follow_graph.check_all(fix)
+    return JsonResponse({'followees': followees, 'followers': followers,
+                         'fixed': fix, 'pid': os.getpid()})
+
+
+@condition(etag_func=conditional.resized_image_etag)
+def resized_image(request, width, height, name):
+    if (not resize.is_allowed(width, height) or not name.startswith('posts/')
+            or posixpath.normpath(name) != name):
+        raise Http404
+    try:
+        path = resize.render(name, width, height)
+    except OSError:
+        # Нет оригинала или это не картинка.
+        raise Http404
+    content_type = mimetypes.guess_type(name)[0]
+    if conditional.accepts_webp(request) and os.path.exists(
+            resize.webp_path(path)):
+        path, content_type = resize.webp_path(path), 'image/webp'
+    response = FileResponse(open(path, 'rb'), content_type=content_type)
+    patch_cache_control(response, public=True, immutable=True,
+                        max_age=settings.RESIZED_IMAGE_MAX_AGE)
+    patch_vary_headers(response, ('Accept',))
+    return response
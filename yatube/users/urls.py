@@ -7,6 +7,8 @@ from django.contrib.auth.views import (LoginView, LogoutView,
                                        PasswordResetView)
 from django.urls import path
 
+from core.ratelimit import ratelimit
+
 from . import views
 
 app_name = 'users'
@@ -20,15 +22,15 @@ urlpatterns = [
         name='logout'),
     path(
         'signup/',
-        views.SignUp.as_view(
+        ratelimit('signup')(views.SignUp.as_view(
             template_name='users/signup.html'
-        ),
+        )),
         name='signup'),
     path(
         'login/',
-        LoginView.as_view(
+        ratelimit('login')(LoginView.as_view(
             template_name='users/login.html'
-        ),
+        )),
         name='login'),
     path(
         'password_change/',
@@ -6,6 +6,79 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 'r5y^ii)2*d1*(8i^!%6t2**sx8o*jsyc6#_lppuo(-_$w6m1go'
 
 POST_PAGE = 10
+# Сколько комментариев показывается на странице поста и подгружается
+# за раз.
+COMMENTS_PAGE = 20
+
+# Сколько номеров страниц показывать по обе стороны от текущей.
+PAGE_LINKS_WINDOW = 3
+
+# Сколько последних постов хранится в материализованной ленте подписок.
+# Новые посты ленту не обрезают: лишнее убирает периодический запуск
+# manage.py trim_timelines.
+FOLLOW_TIMELINE_LENGTH = 500
+
+# Движок ленты подписок: 'timeline' — материализованная лента
+# (fan-out on write), 'merge' — слияние кэшированных голов авторов
+# (fan-out on read).
+FOLLOW_FEED_ENGINE = 'timeline'
+
+# Сколько последних постов автора хранится в его кэшированной голове
+# и сколько секунд она живёт в кэше.
+AUTHOR_HEAD_LENGTH = 100
+AUTHOR_HEAD_TIMEOUT = 60 * 10
+
+# Сколько секунд списки подписок и подписчиков живут в кэше
+# (posts.follow_graph). Подписки правят их сразу; срок ограничивает
+# жизнь расхождений после гонок.
+FOLLOW_GRAPH_TIMEOUT = 60 * 60
+
+# Сколько секунд живут отрендеренные фрагменты лент. Устаревание по
+# времени — страховка: изменения сбрасывают фрагменты сразу.
+FEED_CACHE_TIMEOUT = 60 * 5
+
+# Сколько секунд анонимам отдаются сохранённые страницы
+# (core.page_cache); изменения сбрасывают их раньше.
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Миниатюры картинок постов: имя -> (ширина, высота). Картинка
+# вписывается в рамку с обрезкой по центру. Только эти размеры отдаёт
+# /media/r/<ширина>x<высота>/<имя> (posts.resize), и все они нарезаются
+# сразу после загрузки картинки (posts.thumbnails).
+POST_THUMBNAILS = {
+    'post': (960, 339),
+}
+# Сколько секунд браузеры и CDN хранят миниатюры: содержимое по адресу
+# не меняется.
+RESIZED_IMAGE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Фоновая нарезка миниатюр: число потоков, сколько картинок может ждать
+# в очереди и сколько секунд картинка считается нарезаемой.
+# При THUMBNAIL_WORKERS = 0 миниатюры режутся сразу.
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_QUEUE_LENGTH = 32
+THUMBNAIL_PENDING_TIMEOUT = 60 * 5
+# Картинки не больше стольких пикселей режутся сразу после коммита:
+# их декодирование дешевле передачи в пул.
+THUMBNAIL_INLINE_PIXELS = 100_000
+
+# Лимиты POST-запросов (core.ratelimit), отдельно для IP и для
+# пользователя: ёмкость ведра и сколько токенов прибывает в минуту.
+RATE_LIMITS = {
+    'comment': (10, 6),
+    'post': (5, 2),
+    'signup': (5, 1),
+    'login': (10, 5),
+    'follow': (10, 5),
+}
+
+# Сколько авторов принимает за раз массовая подписка.
+BULK_FOLLOW_LIMIT = 100
+
+# Сколько авторов сохраняет для пользователя recommend_authors и сколько
+# из них показывается в блоке «Кого почитать».
+SUGGESTIONS_PER_USER = 20
+SUGGESTIONS_SHOWN = 5
 
 DEBUG = True
 
@@ -29,7 +102,6 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
-    'sorl.thumbnail',
     'debug_toolbar',
 ]
 
@@ -54,6 +126,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    # Последним, чтобы в кэш попадал ответ без панели отладки.
+    'core.page_cache.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -122,6 +196,20 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки больше этого пишутся порциями во временный файл на диске,
+# а не собираются в памяти.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+# Ограничения картинок постов (PostForm): вес файла, число пикселей,
+# проверяемое по заголовку до декодирования, и большая сторона, до
+# которой картинка уменьшается перед сохранением.
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50 * 10**6
+# Лимит пикселей для форматов без draft() (всё, кроме JPEG): такой кадр
+# декодируется целиком, и пик памяти при уменьшении — около двух кадров.
+POST_IMAGE_MAX_DECODE_PIXELS = 8 * 10**6
+POST_IMAGE_MAX_SIDE = 2560
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',